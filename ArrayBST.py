@@ -0,0 +1,468 @@
+""" Class definition for a Binary Search Tree stored as parallel arrays.
+
+Instead of one object per node, every node is a slot number, and its
+element, key, children, parent and subtree size are kept in one column
+each. Links are slot numbers, with NIL for no node. Slots freed by
+removals are chained together through the left column and reused by
+later adds.
+
+An ArrayBST has the same methods as the root BSTNode of a tree, so a
+MovieLib can use either (see MovieLib(arrays=True)).
+"""
+
+from array import array
+from bisect import bisect_left
+
+NIL = -1
+
+
+class ArrayBST:
+    """ A Binary Search Tree with struct-of-arrays storage. """
+
+    # search_many searches for this many keys or fewer one at a time
+    _BATCH_CUTOFF = 8
+
+    def __init__(self, item, key=None):
+        """ Initialise a tree holding just item.
+
+        Args:
+            item - the element to store
+            key - a function giving the sort key of an element; defaults
+                  to str (as for BSTNode)
+        """
+        if key is None:
+            key = str
+        self._keyfunc = key
+        self._elements = [item]
+        self._keys = [key(item)]
+        self._left = array('i', [NIL])
+        self._right = array('i', [NIL])
+        self._parent = array('i', [NIL])
+        self._sizes = array('i', [1])
+        self._root = 0
+        self._free = NIL  # first free slot; the rest are chained via _left
+
+    def __str__(self):
+        """ Return a string representation of the tree.
+
+        The string will be created by an in-order traversal, in the same
+        format as BSTNode.
+        """
+        traversal = []
+        stack = [self._root]
+        while stack:
+            item = stack.pop()
+            if not isinstance(item, int):
+                traversal.append(item)
+                continue
+            if self._right[item] != NIL:
+                stack.append(')')
+                stack.append(self._right[item])
+            stack.append('(' + str(self._elements[item]) + ')')
+            if self._left[item] != NIL:
+                stack.append(self._left[item])
+                stack.append('(')
+        return ''.join(traversal)
+
+    __repr__ = __str__
+
+    def getElement(self):
+        return self._elements[self._root]
+
+    element = property(getElement)
+
+    # SLOTS
+
+    def _newslot(self, item, key, parent):
+        """ (Private) Return a fresh slot holding item, reusing a free one if any. """
+        slot = self._free
+        if slot == NIL:
+            slot = len(self._elements)
+            self._elements.append(item)
+            self._keys.append(key)
+            self._left.append(NIL)
+            self._right.append(NIL)
+            self._parent.append(parent)
+            self._sizes.append(1)
+            return slot
+        self._free = self._left[slot]
+        self._elements[slot] = item
+        self._keys[slot] = key
+        self._left[slot] = NIL
+        self._right[slot] = NIL
+        self._parent[slot] = parent
+        self._sizes[slot] = 1
+        return slot
+
+    def _freeslot(self, slot):
+        """ (Private) Put slot on the free list. """
+        self._elements[slot] = None
+        self._keys[slot] = None
+        self._right[slot] = NIL
+        self._parent[slot] = NIL
+        self._sizes[slot] = 0
+        self._left[slot] = self._free
+        self._free = slot
+
+    def _retrace(self, slot, change):
+        """ (Private) Add change to the sizes from slot up to the root. """
+        sizes = self._sizes
+        parent = self._parent
+        while slot != NIL:
+            sizes[slot] += change
+            slot = parent[slot]
+
+    # CHILDREN CODE
+
+    def leaf(self):
+        """ Return True if the root has no children. """
+        return self._left[self._root] == NIL and self._right[self._root] == NIL
+
+    # ADDING NODES
+
+    @classmethod
+    def from_sorted(cls, items, key=None):
+        """ Return a perfectly balanced tree holding items, or None.
+
+        Args:
+            items - a list of objects, already in key order and with no
+                    repeated keys
+            key - the key function for the tree, as for ArrayBST()
+
+        Item i goes in slot i, so the columns are filled in one pass.
+        """
+        if not items:
+            return None
+        n = len(items)
+        tree = cls(items[0], key)
+        tree._elements = list(items)
+        tree._keys = [tree._keyfunc(item) for item in items]
+        tree._left = array('i', [NIL]) * n
+        tree._right = array('i', [NIL]) * n
+        tree._parent = array('i', [NIL]) * n
+        tree._sizes = array('i', [0]) * n
+        tree._root = (n - 1) // 2
+        # each task is (lo, hi, parent) for items[lo:hi]
+        tasks = [(0, n, NIL)]
+        while tasks:
+            lo, hi, parent = tasks.pop()
+            mid = (lo + hi - 1) // 2
+            tree._parent[mid] = parent
+            tree._sizes[mid] = hi - lo
+            if lo < mid:
+                tree._left[mid] = (lo + mid - 1) // 2
+                tasks.append((lo, mid, mid))
+            if mid + 1 < hi:
+                tree._right[mid] = (mid + hi) // 2
+                tasks.append((mid + 1, hi, mid))
+        return tree
+
+    def add(self, obj):
+        """ Add item to the tree, maintaining BST properties.
+
+        Returns the item added, or None if a matching object was already there.
+        """
+        key = self._keyfunc(obj)
+        keys = self._keys
+        current = self._root
+        while True:
+            if key == keys[current]:
+                return None
+            if keys[current] < key:
+                if self._right[current] == NIL:
+                    slot = self._newslot(obj, key, current)
+                    self._right[current] = slot
+                    break
+                current = self._right[current]
+            else:
+                if self._left[current] == NIL:
+                    slot = self._newslot(obj, key, current)
+                    self._left[current] = slot
+                    break
+                current = self._left[current]
+        self._retrace(current, 1)
+        return obj
+
+    # SEARCHING FOR NODES
+
+    def _find(self, key, start=None):
+        """ (Private) Return the slot whose key is key, or NIL.
+
+        Searches the subtree at slot start (by default the whole tree), with
+        one comparison per level, as BSTNode._find does.
+        """
+        keys = self._keys
+        left = self._left
+        right = self._right
+        candidate = NIL
+        current = start
+        if start is None:
+            current = self._root
+        while current != NIL:
+            if key < keys[current]:
+                current = left[current]
+            else:
+                candidate = current
+                current = right[current]
+        if candidate != NIL and keys[candidate] == key:
+            return candidate
+        return NIL
+
+    def search(self, searchitem):
+        """ Return object matching searchitem, or None. """
+        return self.search_key(self._keyfunc(searchitem))
+
+    def search_key(self, key):
+        """ Return the object whose key is key, or None. """
+        slot = self._find(key)
+        if slot == NIL:
+            return None
+        return self._elements[slot]
+
+    def search_many(self, keys):
+        """ Return a list of the objects whose keys are keys (None where missing).
+
+        Looks the keys up together in one walk, as BSTNode.search_many does.
+        """
+        queries = sorted(set(keys))
+        found = {}
+        tasks = [(self._root, 0, len(queries))]
+        while tasks:
+            slot, lo, hi = tasks.pop()
+            if hi - lo <= ArrayBST._BATCH_CUTOFF:
+                for key in queries[lo:hi]:
+                    match = self._find(key, slot)
+                    if match != NIL:
+                        found[key] = self._elements[match]
+                continue
+            key = self._keys[slot]
+            i = bisect_left(queries, key, lo, hi)
+            j = i
+            if i < hi and queries[i] == key:
+                found[key] = self._elements[slot]
+                j = i + 1
+            if lo < i and self._left[slot] != NIL:
+                tasks.append((self._left[slot], lo, i))
+            if j < hi and self._right[slot] != NIL:
+                tasks.append((self._right[slot], j, hi))
+        return [found.get(key) for key in keys]
+
+    # TRAVERSING NODES
+
+    def __iter__(self):
+        """ Yield the elements of the tree, in order. """
+        return self.items()
+
+    def items(self, lo=None, hi=None):
+        """ Yield the elements from key lo (inclusive) up to hi (exclusive), in order.
+
+        Either bound can be None for no bound, as for BSTNode.items.
+        """
+        keys = self._keys
+        stack = []
+        current = self._root
+        while current != NIL:
+            if lo is None or not keys[current] < lo:
+                stack.append(current)
+                current = self._left[current]
+            else:
+                current = self._right[current]
+        while stack:
+            slot = stack.pop()
+            if hi is not None and not keys[slot] < hi:
+                return
+            yield self._elements[slot]
+            current = self._right[slot]
+            while current != NIL:
+                stack.append(current)
+                current = self._left[current]
+
+    # REMOVING NODES
+
+    def remove(self, searchitem):
+        """ Remove and return the object matching searchitem, if there. """
+        return self.remove_key(self._keyfunc(searchitem))
+
+    remove_node = remove
+
+    def remove_key(self, key):
+        """ Remove the element whose key is key from the tree, and return it.
+
+        Maintains the BST properties. Returns None if key is not in the
+        tree. As with BSTNode, the last element is never removed: it is
+        left in place for the caller to discard.
+        """
+        slot = self._find(key)
+        if slot == NIL:
+            return None
+        removed = self._elements[slot]
+        left = self._left
+        right = self._right
+        parent = self._parent
+
+        if left[slot] != NIL and right[slot] != NIL:
+            # pull the largest element of the left subtree up into this
+            # slot, and unlink the slot it came from instead
+            largest = left[slot]
+            while right[largest] != NIL:
+                largest = right[largest]
+            self._elements[slot] = self._elements[largest]
+            self._keys[slot] = self._keys[largest]
+            slot = largest
+
+        child = left[slot]
+        if child == NIL:
+            child = right[slot]
+        above = parent[slot]
+        if above == NIL:
+            if child == NIL:
+                return removed
+            self._root = child
+        elif left[above] == slot:
+            left[above] = child
+        else:
+            right[above] = child
+        if child != NIL:
+            parent[child] = above
+        self._retrace(above, -1)
+        self._freeslot(slot)
+        return removed
+
+    # MISC CODE
+
+    def copy(self):
+        """ Return an independent copy of this tree (the elements are shared). """
+        tree = ArrayBST.__new__(ArrayBST)
+        tree._keyfunc = self._keyfunc
+        tree._elements = self._elements[:]
+        tree._keys = self._keys[:]
+        tree._left = self._left[:]
+        tree._right = self._right[:]
+        tree._parent = self._parent[:]
+        tree._sizes = self._sizes[:]
+        tree._root = self._root
+        tree._free = self._free
+        return tree
+
+    def findmaxnode(self):
+        """ Return the maximal element in the tree. """
+        current = self._root
+        while self._right[current] != NIL:
+            current = self._right[current]
+        return self._elements[current]
+
+    def height(self):
+        """ Return the height of the tree. """
+        height = -1
+        level = [self._root]
+        while level:
+            height += 1
+            nextlevel = []
+            for slot in level:
+                if self._left[slot] != NIL:
+                    nextlevel.append(self._left[slot])
+                if self._right[slot] != NIL:
+                    nextlevel.append(self._right[slot])
+            level = nextlevel
+        return height
+
+    def size(self):
+        """ Return the number of elements in the tree. """
+        return self._sizes[self._root]
+
+    def rank(self, key):
+        """ Return the number of elements with keys before key. """
+        rank = 0
+        current = self._root
+        while current != NIL:
+            if self._keys[current] < key:
+                if self._left[current] != NIL:
+                    rank += self._sizes[self._left[current]]
+                rank += 1
+                current = self._right[current]
+            else:
+                current = self._left[current]
+        return rank
+
+    def select(self, k):
+        """ Return the element at (zero-based) position k in order, or None. """
+        if k < 0 or k >= self.size():
+            return None
+        current = self._root
+        while True:
+            leftsize = 0
+            if self._left[current] != NIL:
+                leftsize = self._sizes[self._left[current]]
+            if k < leftsize:
+                current = self._left[current]
+            elif k == leftsize:
+                return self._elements[current]
+            else:
+                k -= leftsize + 1
+                current = self._right[current]
+
+    def _stats(self):
+        """ Return the basic stats on the tree. """
+        return 'size = ' + str(self.size()) + '; height = ' + str(self.height())
+
+    def _properBST(self):
+        """ Return True if the columns hold a proper BST; False otherwise.
+
+        Checks that parent and child links agree, that every size and key
+        is right, that keys are in order, and that every slot is either in
+        the tree or on the free list.
+        """
+        left = self._left
+        right = self._right
+        seen = 0
+        stack = [self._root]
+        if self._parent[self._root] != NIL:
+            return False
+        while stack:
+            slot = stack.pop()
+            seen += 1
+            size = 1
+            for child in (left[slot], right[slot]):
+                if child != NIL:
+                    if self._parent[child] != slot:
+                        return False
+                    size += self._sizes[child]
+                    stack.append(child)
+            if size != self._sizes[slot]:
+                return False
+            if self._keys[slot] != self._keyfunc(self._elements[slot]):
+                return False
+        free = self._free
+        while free != NIL:
+            seen += 1
+            free = left[free]
+        if seen != len(self._elements):
+            return False
+        lastkey = None
+        for item in self:
+            key = self._keyfunc(item)
+            if lastkey is not None and not lastkey < key:
+                return False
+            lastkey = key
+        return True
+
+    @staticmethod
+    def _test():
+        tree = ArrayBST("M")
+        for name in "FTBHPWAC":
+            print('adding', name)
+            tree.add(name)
+        print('Ordered:', tree)
+        print(tree._stats())
+        for name in "FMAZ":
+            print('removing', name, '->', tree.remove(name))
+            print('Ordered:', tree)
+            print('proper BST:', tree._properBST())
+        print('adding X and F, which reuse the freed slots')
+        tree.add("X")
+        tree.add("F")
+        print('Ordered:', tree, '-', len(tree._elements), 'slots')
+        print('proper BST:', tree._properBST())
+
+
+# ArrayBST._test()
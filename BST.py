@@ -4,9 +4,11 @@
 # https://stackoverflow.com/questions/47312815/python-binary-search-tree-size/47313099
 
 # Comparing strings out of ease in this assignment
-# See in the .__str__() searching methods, etc.
+# Each node caches the sort key of its element (by default its .__str__())
+# and all searching methods, etc. compare those keys
 # Getters/setters/properties added just to get rid of yellow underlines in PyCharm
 
+from bisect import bisect_left
 from functools import total_ordering
 
 
@@ -68,28 +70,64 @@ class TestClass:
 
 
 class BSTNode:
-    """ An internal node for a Binary Search Tree.  """
+    """ An internal node for a Binary Search Tree.
 
-    def __init__(self, item):
-        """ Initialise a BSTNode on creation, with value==item. """
+    The tree is ordered on a key worked out once for each element when it
+    is added: key(element) if a key function was given for the tree, and
+    str(element) otherwise. The key is kept in the node, so searches only
+    compare keys and never call back into the elements.
+
+    Each node also counts the nodes in its own subtree, so size() is O(1)
+    and rank()/select() only need a single walk down the tree.
+    """
+
+    __slots__ = ('_element', '_keyfunc', '_key', '_leftchild', '_rightchild',
+                 '_parent', '_size')
+
+    # search_many searches for this many keys or fewer one at a time
+    _BATCH_CUTOFF = 8
+
+    def __init__(self, item, key=None):
+        """ Initialise a BSTNode on creation, with value==item.
+
+        Args:
+            item - the element to store
+            key - a function giving the sort key of an element; defaults
+                  to str. Nodes added below this one share it.
+        """
+        if key is None:
+            key = str
         self._element = item
+        self._keyfunc = key
+        self._key = key(item)
         self._leftchild = None
         self._rightchild = None
         self._parent = None
+        self._size = 1
 
     def __str__(self):
         """ Return a string representation of the tree rooted at this node.
 
         The string will be created by an in-order traversal.
         """
-        # method body goes here
-        traversal = ''
-        if self._leftchild is not None:
-            traversal += '(' + str(self._leftchild)
-        traversal += '(' + str(self._element) + ')'
-        if self._rightchild is not None:
-            traversal += str(self._rightchild) + ')'
-        return traversal
+        # walk the tree with an explicit stack of nodes still to expand and
+        # pieces of string still to emit, so deep trees don't hit the
+        # recursion limit
+        traversal = []
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if not isinstance(item, BSTNode):
+                traversal.append(item)
+                continue
+            if item._rightchild is not None:
+                stack.append(')')
+                stack.append(item._rightchild)
+            stack.append('(' + str(item._element) + ')')
+            if item._leftchild is not None:
+                stack.append(item._leftchild)
+                stack.append('(')
+        return ''.join(traversal)
 
     __repr__ = __str__
 
@@ -134,24 +172,28 @@ class BSTNode:
         """ (Private) Print a structured representation of tree at this node. """
         if not self._isthisapropertree():
             print("ERROR: this is not a proper Binary Search Tree. ++++++++++")
-        outstr = str(self._element) + ' (hgt=' + str(self.height()) + ')['
-        if self._leftchild is not None:
-            outstr = outstr + "left: " + str(self.leftchild.element)
-        else:
-            outstr = outstr + 'left: *'
-        if self._rightchild is not None:
-            outstr = outstr + "; right: " + str(self.rightchild.element) + ']'
-        else:
-            outstr = outstr + '; right: *]'
-        if self._parent is not None:
-            outstr = outstr + ' -- parent: ' + str(self.parent.element)
-        else:
-            outstr = outstr + ' -- parent: *'
-        print(outstr)
-        if self.leftchild is not None:
-            self.leftchild._print_structure()
-        if self._rightchild is not None:
-            self.rightchild._print_structure()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            outstr = str(node._element) + ' (hgt=' + str(node.height()) + ')['
+            if node._leftchild is not None:
+                outstr = outstr + "left: " + str(node.leftchild.element)
+            else:
+                outstr = outstr + 'left: *'
+            if node._rightchild is not None:
+                outstr = outstr + "; right: " + str(node.rightchild.element) + ']'
+            else:
+                outstr = outstr + '; right: *]'
+            if node._parent is not None:
+                outstr = outstr + ' -- parent: ' + str(node.parent.element)
+            else:
+                outstr = outstr + ' -- parent: *'
+            print(outstr)
+            # right pushed first so the left subtree is printed first
+            if node._rightchild is not None:
+                stack.append(node._rightchild)
+            if node._leftchild is not None:
+                stack.append(node._leftchild)
 
     def _properBST(self):
         """ Return True if this is the root of a proper BST; False otherwise.
@@ -173,39 +215,54 @@ class BSTNode:
                 boolean is True if it is a BST, and false otherwise
                 minvalue is the lowest value in this subtree
                 maxvalue is the highest value in this subtree
+
+        The subtree is a BST exactly when its in-order traversal never steps
+        down, so this checks each key against the one before it, and that
+        each key is the one its element should have.
         """
-        minvalue = self._element
-        maxvalue = self._element
-        if self._leftchild is not None:
-            leftstate = self._leftchild._BSTproperties()
-            if not leftstate[0] or leftstate[2] > self._element:
+        minvalue = None
+        maxvalue = None
+        lastkey = None
+        first = True
+        stack = []
+        node = self
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node._leftchild
+                continue
+            node = stack.pop()
+            if node._key != node._keyfunc(node._element):
                 return False, None, None
-            minvalue = leftstate[1]
-
-        if self._rightchild is not None:
-            rightstate = self._rightchild._BSTproperties()
-            if not rightstate[0] or rightstate[1] < self._element:
+            if first:
+                minvalue = node._element
+                first = False
+            elif lastkey > node._key:
                 return False, None, None
-            maxvalue = rightstate[2]
-
+            maxvalue = node._element
+            lastkey = node._key
+            node = node._rightchild
         return True, minvalue, maxvalue
 
     def _isthisapropertree(self):
         """ Return True if this node is a properly implemented tree. """
         ok = True
-        if self.leftchild is not None:
-            if self.leftchild.parent != self:
-                ok = False
-            if not self.leftchild._isthisapropertree():
-                ok = False
-        if self.rightchild is not None:
-            if self.rightchild.parent != self:
-                ok = False
-            if not self.rightchild._isthisapropertree():
-                ok = False
         if self.parent is not None:
             if self.parent.leftchild != self and self.parent.rightchild != self:
                 ok = False
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._size != 1 + BSTNode._s(node._leftchild) + BSTNode._s(node._rightchild):
+                ok = False
+            if node.leftchild is not None:
+                if node.leftchild.parent != node:
+                    ok = False
+                stack.append(node.leftchild)
+            if node.rightchild is not None:
+                if node.rightchild.parent != node:
+                    ok = False
+                stack.append(node.rightchild)
         return ok
 
     # CHILDREN CODE
@@ -242,34 +299,83 @@ class BSTNode:
 
     # ADDING NODES
 
+    @classmethod
+    def from_sorted(cls, items, key=None):
+        """ Return the root of a perfectly balanced tree holding items, or None.
+
+        Args:
+            items - a list of objects, already in key order and with no
+                    repeated keys
+            key - the key function for the tree, as for BSTNode()
+
+        Each subtree takes the middle item of its slice as its root, so the
+        tree is built in O(n) with no comparisons at all.
+        """
+        if not items:
+            return None
+        nodes = []
+        root = None
+        # each task is (lo, hi, parent, is left child) for items[lo:hi]
+        tasks = [(0, len(items), None, False)]
+        while tasks:
+            lo, hi, parent, left = tasks.pop()
+            mid = (lo + hi) // 2
+            node = cls(items[mid], key)
+            nodes.append(node)
+            node._parent = parent
+            if parent is None:
+                root = node
+            elif left:
+                parent._leftchild = node
+            else:
+                parent._rightchild = node
+            if mid + 1 < hi:
+                tasks.append((mid + 1, hi, node, False))
+            if lo < mid:
+                tasks.append((lo, mid, node, True))
+        # every node was made after its parent, so fixing them up in reverse
+        # sees both children before the parent
+        for node in reversed(nodes):
+            node._update()
+        return root
+
     def add(self, obj):
         """ Add item to the tree, maintaining BST properties.
 
         Returns the item added, or None if a matching object was already there.
         """
-        # method body goes here
-        if obj == self._element:
+        key = self._keyfunc(obj)
+        current, right = self._addpoint(key)
+        if right is None:
             # don't add already existing data to tree
             return None
+        newNode = self.__class__(obj, self._keyfunc)
+        newNode._parent = current
+        if right:
+            current._rightchild = newNode
         else:
-            if self._element < obj:
-                if self.rightchild is None:
-                    newNode = BSTNode(obj)
-                    newNode.parent = self
-                    self.rightchild = newNode
-                    return obj
-                else:
-                    return self._rightchild.add(obj)
-            elif obj < self._element:
-                if self.leftchild is None:
-                    newNode = BSTNode(obj)
-                    newNode.parent = self
-                    self.leftchild = newNode
-                    return obj
-                else:
-                    return self._leftchild.add(obj)
+            current._leftchild = newNode
+        self._retrace(current)
+        return obj
+
+    def _addpoint(self, key):
+        """ (Private) Return (node, right) for where key belongs below here.
+
+        right is None if node already holds key. Otherwise key belongs in
+        node's empty right child if right is True, or its left child if not.
+        """
+        current = self
+        while True:
+            if key == current._key:
+                return current, None
+            if current._key < key:
+                if current._rightchild is None:
+                    return current, True
+                current = current._rightchild  # move down a generation
             else:
-                return None
+                if current._leftchild is None:
+                    return current, False
+                current = current._leftchild  # move down a generation
 
     # SEARCHING FOR NODES
 
@@ -277,31 +383,30 @@ class BSTNode:
         """ Return the BSTNode (with subtree) containing searchitem, or None.
 
         Args:
-            searchitem: an object of any class stored in the BST
+            searchitem: a BSTNode wrapping an object of any class stored in the BST
         """
-        # method body goes here
-        if self.element is None:
+        if self._element is None:
             # empty tree
             return None
-        else:
-            # stuff in tree
-            if self.element.__str__() < searchitem.element.__str__():
-                # move to larger items
-                if self.rightchild is None:
-                    return None  # run out of tree
-                return self.rightchild.search_node(searchitem)
-                # move down a generation
-
-            elif searchitem.element.__str__() < self.element.__str__():
-                # move to smaller items
-                if self.leftchild is None:
-                    return None  # run out of tree
-                return self.leftchild.search_node(searchitem)
-                # move down a generation
+        return self._find(self._keyfunc(searchitem.element))
 
+    def _find(self, key):
+        """ (Private) Return the BSTNode whose key is key, or None.
+
+        Makes one comparison per level: the equality test is left until
+        the bottom of the tree, on the last node that wasn't bigger.
+        """
+        candidate = None
+        current = self
+        while current is not None:
+            if key < current._key:
+                current = current._leftchild  # move to smaller items
             else:
-                # found correct item
-                return searchitem
+                candidate = current
+                current = current._rightchild  # move to larger items
+        if candidate is not None and candidate._key == key:
+            return candidate
+        return None  # run out of tree
 
     def search(self, searchitem):
         """ Return object matching searchitem, or None.
@@ -310,15 +415,100 @@ class BSTNode:
             searchitem: an object of any class stored in the BST
 
         """
-        # method body goes here
-        return self.search_node(BSTNode(searchitem))
+        return self.search_key(self._keyfunc(searchitem))
+
+    def search_key(self, key):
+        """ Return the object whose key is key, or None.
+
+        Args:
+            key: a key, as given by the tree's key function
+        """
+        node = self._find(key)
+        if node is None:
+            return None
+        return node._element
+
+    def search_many(self, keys):
+        """ Return a list of the objects whose keys are keys, in the same order.
+
+        Args:
+            keys: a list of keys, as given by the tree's key function
+
+        The list has None for each key that isn't in the tree. The keys are
+        sorted and looked up together in one walk down the tree: a node is
+        visited once however many of their paths go through it, and a
+        subtree is only entered if one of the keys could be in it. Once only
+        a few keys share a subtree, each is searched for on its own from
+        there, as splitting them up would cost more than it saves.
+        """
+        queries = sorted(set(keys))
+        found = {}
+        # each task is (node, lo, hi): queries[lo:hi] can only be at or below node
+        tasks = [(self, 0, len(queries))]
+        while tasks:
+            node, lo, hi = tasks.pop()
+            if hi - lo <= BSTNode._BATCH_CUTOFF:
+                for key in queries[lo:hi]:
+                    match = node._find(key)
+                    if match is not None:
+                        found[key] = match._element
+                continue
+            i = bisect_left(queries, node._key, lo, hi)
+            j = i
+            if i < hi and queries[i] == node._key:
+                found[node._key] = node._element
+                j = i + 1
+            if lo < i and node._leftchild is not None:
+                tasks.append((node._leftchild, lo, i))
+            if j < hi and node._rightchild is not None:
+                tasks.append((node._rightchild, j, hi))
+        return [found.get(key) for key in keys]
+
+    # TRAVERSING NODES
+
+    def __iter__(self):
+        """ Yield the elements of the tree rooted at this node, in order. """
+        return self.items()
+
+    def items(self, lo=None, hi=None):
+        """ Yield the elements from lo (inclusive) up to hi (exclusive), in order.
+
+        Args:
+            lo - a key, as given by the tree's key function, or None for no
+                 lower bound
+            hi - as for lo, or None for no upper bound
+
+        Only the path down to lo and the k elements yielded are visited, so
+        taking k elements costs O(height + k).
+        """
+        # the stack holds the nodes still to yield, with the next one on top;
+        # its right subtree is only explored once that node is yielded
+        stack = []
+        current = self
+        while current is not None:
+            if lo is None or not current._key < lo:
+                stack.append(current)
+                current = current._leftchild
+            else:
+                current = current._rightchild
+        while stack:
+            node = stack.pop()
+            if hi is not None and not node._key < hi:
+                return
+            yield node._element
+            current = node._rightchild
+            while current is not None:
+                stack.append(current)
+                current = current._leftchild
 
     # REMOVING NODES
 
     def remove_node(self, searchitem):
-        """ Remove this BSTNode from its tree, and return its element.
+        """ Remove the node matching searchitem from the tree, and return its element.
 
-        Maintains the BST properties.
+        Maintains the BST properties. Returns None if searchitem is not in
+        the tree. The root node itself is never unlinked: if it is the only
+        node, its element is left in place for the caller to discard.
         """
         # if this is a full node
         # find the biggest item in the left tree
@@ -326,73 +516,56 @@ class BSTNode:
         #  - the node for that item can have no right children
         # move that item up into this item
         # remove that old node, which is now a semileaf
-        # return the original element
-        # else if this has no children
-        # find who the parent was
-        # set the parent's appropriate child to None
-        # wipe this node
-        # return this node's element
-        # else if this has no right child (but must have a left child)
-        # shift leftchild up into its place, and clean up
-        # return the original element
-        # else this has no left child (but must have a right child)
-        # shift rightchild up into its place, and clean up
-        # return the original element
-        if self.search(searchitem) is not None:
-            # if we can find it, we can delete it
-            while self.element.__str__() != searchitem.__str__():
-                if self.element.__str__() > searchitem.__str__():
-                    current = self.leftchild
-                    return current.remove_node(searchitem)
-                elif self.element.__str__() < searchitem.__str__():
-                    return self.rightchild.remove_node(searchitem)
-                else:
-                    return self
-            else:
-                if self.full():
-                    largestLeft = self.leftchild.findmaxnode()
-                    self.remove_node(largestLeft)
-                    self.element = largestLeft
-                elif self.leaf():
-                    if self.parent is not None:
-                        if self.element.__str__() > self.parent.element.__str__():
-                            self.parent.rightchild = None
-                        elif self.element.__str__() < self.parent.element.__str__():
-                            self.parent.leftchild = None
-                else:
-                    # internal
-                    if self.rightchild is not None:
-                        if self.parent is not None:
-                            if self.rightchild.leftchild is not None:
-                                self.leftchild = self.rightchild.leftchild
-                            self.element = self.rightchild.element
-                            self.rightchild = self.rightchild.rightchild
-                            if self.leftchild is not None:
-                                self.leftchild.parent = self
-                            if self.rightchild is not None:
-                                self.rightchild.parent = self
-                        else:
-                            if self.rightchild.leftchild is not None:
-                                self.leftchild = self.rightchild.leftchild
-                            self.element = self.rightchild.element
-                            self.rightchild = self.rightchild.rightchild
-                    elif self.leftchild is not None:
-                        if self.parent is not None:
-                            if self.leftchild.rightchild is not None:
-                                self.rightchild = self.leftchild.rightchild
-                            self.element = self.leftchild.element
-                            self.leftchild = self.leftchild.leftchild
-                            self.leftchild.parent = self
-                            self.rightchild.parent = self
-                        else:
-                            if self.leftchild.rightchild is not None:
-                                self.rightchild = self.leftchild.rightchild
-                            self.element = self.leftchild.element
-                            self.leftchild = self.leftchild.leftchild
-            return searchitem
-        return None
+        # else the node has at most one child
+        # splice that child (or None) into the parent's place for the node
+        # unless the node is the root, in which case copy the child up
+        return self.remove_key(self._keyfunc(searchitem))
 
-        # method body goes here
+    def remove_key(self, key):
+        """ Remove the node whose key is key from the tree, and return its element.
+
+        As for remove_node, but takes a key.
+        """
+        node = self._find(key)
+        if node is None:
+            return None
+        removed = node._element
+
+        if node.full():
+            largest = node._leftchild
+            while largest._rightchild is not None:
+                largest = largest._rightchild
+            node._element = largest._element
+            node._key = largest._key
+            node = largest
+
+        if node._leftchild is not None:
+            child = node._leftchild
+        else:
+            child = node._rightchild
+        parent = node._parent
+        if parent is None:
+            # node is the root: pull the only child up into it
+            if child is not None:
+                node._element = child._element
+                node._key = child._key
+                node._leftchild = child._leftchild
+                node._rightchild = child._rightchild
+                if node._leftchild is not None:
+                    node._leftchild._parent = node
+                if node._rightchild is not None:
+                    node._rightchild._parent = node
+            self._retrace(node)
+            return removed
+        if parent._leftchild is node:
+            parent._leftchild = child
+        else:
+            parent._rightchild = child
+        if child is not None:
+            child._parent = parent
+        node._parent = None
+        self._retrace(parent)
+        return removed
 
     def remove(self, searchitem):
         """ Remove and return the object matching searchitem, if there.
@@ -408,12 +581,58 @@ class BSTNode:
 
     # MISC CODE
 
+    @staticmethod
+    def _s(node):
+        """ (Private) Return the stored size of node, or 0 for None. """
+        if node is None:
+            return 0
+        return node._size
+
+    def _update(self):
+        """ (Private) Recompute the stored size from the two children. """
+        self._size = 1 + BSTNode._s(self._leftchild) + BSTNode._s(self._rightchild)
+
+    def _retrace(self, node):
+        """ (Private) Called after an add or remove with the lowest changed node.
+
+        Fixes the subtree sizes on the path from node back up to the root.
+        """
+        while node is not None:
+            node._update()
+            node = node._parent
+
+    @classmethod
+    def counting(cls, stats):
+        """ Return a subclass of this class whose nodes count their work into stats.
+
+        Nodes of the subclass record each add, search_key and remove_key
+        made on them in stats (a TreeStats). Plain nodes pay nothing for
+        this: a tree is only counted while its nodes are switched to the
+        subclass (see _setclass).
+        """
+        return type('Counting' + cls.__name__, (_CountingNode, cls),
+                    {'__slots__': (), 'treestats': stats})
+
+    def _setclass(self, nodeclass):
+        """ (Private) Switch every node at or below here to nodeclass.
+
+        nodeclass must have the same slots, such as the result of counting().
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node.__class__ = nodeclass
+            if node._leftchild is not None:
+                stack.append(node._leftchild)
+            if node._rightchild is not None:
+                stack.append(node._rightchild)
+
     def findmaxnode(self):
-        """ Return the BSTNode with maximal element at or below here. """
-        # method body goes here
-        if self.rightchild is not None:
-            return self.rightchild.findmaxnode()
-        return self.element
+        """ Return the maximal element at or below here. """
+        current = self
+        while current._rightchild is not None:
+            current = current._rightchild
+        return current._element
 
     def height(self):
         """ Return the height of this node.
@@ -421,13 +640,19 @@ class BSTNode:
         Note that with the recursive definition of the tree the height of the
         node is the same as the depth of the tree rooted at this node.
         """
-        # method body goes here
-        leftSide, rightSide = -1, -1
-        if self.rightchild is not None:
-            rightSide = self.rightchild.height()
-        if self.leftchild is not None:
-            leftSide = self.leftchild.height()
-        return 1 + max(rightSide, leftSide)
+        # count the levels of a level-by-level walk
+        height = -1
+        level = [self]
+        while level:
+            height += 1
+            nextlevel = []
+            for node in level:
+                if node._leftchild is not None:
+                    nextlevel.append(node._leftchild)
+                if node._rightchild is not None:
+                    nextlevel.append(node._rightchild)
+            level = nextlevel
+        return height
 
     def size(self):
         """ Return the size of this subtree.
@@ -435,14 +660,38 @@ class BSTNode:
         The size is the number of nodes (or elements) in the tree,
         including this node.
         """
-        # method body goes here
-        size = 1  # this is our root node
-        if self is not None:
-            if self.rightchild is not None:
-                size += self.rightchild.size()  # recursively add
-            if self.leftchild is not None:
-                size += self.leftchild.size()  # recursively add
-        return size
+        return self._size
+
+    def rank(self, key):
+        """ Return the number of elements in this subtree with keys before key.
+
+        This is the (zero-based) position of key in an in-order traversal if
+        it is in the tree, and where it would go if not.
+        """
+        rank = 0
+        current = self
+        while current is not None:
+            if current._key < key:
+                rank += BSTNode._s(current._leftchild) + 1
+                current = current._rightchild
+            else:
+                current = current._leftchild
+        return rank
+
+    def select(self, k):
+        """ Return the element at (zero-based) position k in order, or None. """
+        if k < 0 or k >= self._size:
+            return None
+        current = self
+        while True:
+            leftsize = BSTNode._s(current._leftchild)
+            if k < leftsize:
+                current = current._leftchild
+            elif k == leftsize:
+                return current._element
+            else:
+                k -= leftsize + 1
+                current = current._rightchild
 
     @staticmethod
     def _testadd():
@@ -558,6 +807,293 @@ class BSTNode:
         print(node)
 
 
+class AVLNode(BSTNode):
+    """ An internal node for a self-balancing (AVL) Binary Search Tree.
+
+    Every node stores its own height. After an add or a remove the path back
+    up to the root is walked, and any node whose subtrees differ in height by
+    more than one is fixed with a single or double rotation. This keeps the
+    height of a tree with n nodes below about 1.44*log2(n).
+
+    Rotations swap elements between the top two nodes instead of relinking
+    the top node, so the node at the root of the tree stays the root (the
+    MovieLib only keeps a reference to that one node).
+    """
+
+    __slots__ = ('_height',)
+
+    def __init__(self, item, key=None):
+        """ Initialise an AVLNode on creation, with value==item. """
+        BSTNode.__init__(self, item, key)
+        self._height = 0
+
+    # HEIGHTS AND ROTATIONS
+
+    @staticmethod
+    def _h(node):
+        """ (Private) Return the stored height of node, or -1 for None. """
+        if node is None:
+            return -1
+        return node._height
+
+    def _update(self):
+        """ (Private) Recompute the stored size and height from the two children. """
+        BSTNode._update(self)
+        self._height = 1 + max(AVLNode._h(self._leftchild), AVLNode._h(self._rightchild))
+
+    def _balance(self):
+        """ (Private) Return height of left subtree minus height of right. """
+        return AVLNode._h(self._leftchild) - AVLNode._h(self._rightchild)
+
+    def _rotate_right(self):
+        """ (Private) Rotate the left child up into this position.
+
+        This node keeps its place in the tree but takes over the left
+        child's element; the left child node moves down to the right.
+        """
+        pivot = self._leftchild
+        self._element, pivot._element = pivot._element, self._element
+        self._key, pivot._key = pivot._key, self._key
+        self._leftchild = pivot._leftchild
+        if self._leftchild is not None:
+            self._leftchild._parent = self
+        pivot._leftchild = pivot._rightchild
+        pivot._rightchild = self._rightchild
+        if pivot._rightchild is not None:
+            pivot._rightchild._parent = pivot
+        self._rightchild = pivot
+        pivot._update()
+        self._update()
+
+    def _rotate_left(self):
+        """ (Private) Rotate the right child up into this position.
+
+        Mirror image of _rotate_right.
+        """
+        pivot = self._rightchild
+        self._element, pivot._element = pivot._element, self._element
+        self._key, pivot._key = pivot._key, self._key
+        self._rightchild = pivot._rightchild
+        if self._rightchild is not None:
+            self._rightchild._parent = self
+        pivot._rightchild = pivot._leftchild
+        pivot._leftchild = self._leftchild
+        if pivot._leftchild is not None:
+            pivot._leftchild._parent = pivot
+        self._leftchild = pivot
+        pivot._update()
+        self._update()
+
+    def _retrace(self, node):
+        """ (Private) Fix heights and balance from node up to the root.
+
+        Called by add and remove_node with the lowest node that changed.
+        """
+        while node is not None:
+            node._update()
+            balance = node._balance()
+            if balance > 1:
+                if node._leftchild._balance() < 0:
+                    node._leftchild._rotate_left()
+                node._rotate_right()
+            elif balance < -1:
+                if node._rightchild._balance() > 0:
+                    node._rightchild._rotate_right()
+                node._rotate_left()
+            node = node._parent
+
+    # MISC CODE
+
+    def height(self):
+        """ Return the height of this node, as stored. """
+        return self._height
+
+    def _properBST(self):
+        """ Return True if this is the root of a proper AVL tree; False otherwise.
+
+        As for BSTNode, then also checks that every stored height is right
+        and every node is balanced.
+        """
+        if not BSTNode._properBST(self):
+            return False
+        return self._AVLproperties()[0]
+
+    def _AVLproperties(self):
+        """ Return (boolean, height) for the AVL tree rooted at this node.
+
+        If every node's stored height is one more than its taller child's,
+        all of the stored heights are right, so each node is checked locally.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            leftheight = AVLNode._h(node._leftchild)
+            rightheight = AVLNode._h(node._rightchild)
+            if node._height != 1 + max(leftheight, rightheight):
+                return False, None
+            if abs(leftheight - rightheight) > 1:
+                return False, None
+            if node._leftchild is not None:
+                stack.append(node._leftchild)
+            if node._rightchild is not None:
+                stack.append(node._rightchild)
+        return True, self._height
+
+    @staticmethod
+    def _test():
+        node = AVLNode(TestClass("A", "a"))
+        for name in "BCDEFGHIJKLMNO":
+            print('adding', name)
+            node.add(TestClass(name, name.lower()))
+        print('Ordered:', node)
+        node._print_structure()
+        print('height should be 3, and is', node.height())
+        for name in "AEIMBCD":
+            print('removing', name)
+            node.remove(TestClass(name))
+            print('Ordered:', node)
+            print('proper AVL tree:', node._properBST())
+        node._print_structure()
+
+
+class TreeStats:
+    """ Counts of the work done by the adds, searches and removes on a tree.
+
+    For each kind of operation it keeps the number of calls, the key
+    comparisons made and the nodes visited, and for all of them together a
+    histogram of the path lengths (the depth reached, counted in nodes) and
+    the longest path. A long path shows a skewed tree; many comparisons per
+    node visited would show the keys are costly to compare.
+    """
+
+    OPERATIONS = ('add', 'search', 'remove')
+
+    def __init__(self):
+        """ Initialise the counts at zero. """
+        self.reset()
+
+    def reset(self):
+        """ Set every count back to zero. """
+        self.calls = dict.fromkeys(TreeStats.OPERATIONS, 0)
+        self.comparisons = dict.fromkeys(TreeStats.OPERATIONS, 0)
+        self.visits = dict.fromkeys(TreeStats.OPERATIONS, 0)
+        self.depths = {}
+        self.maxdepth = 0
+        self.pending = (0, 0)  # the counts of the last search, until recorded
+
+    def record(self, operation, comparisons, visits):
+        """ Count one operation, which made comparisons and went visits nodes deep. """
+        self.calls[operation] += 1
+        self.comparisons[operation] += comparisons
+        self.visits[operation] += visits
+        self.depths[visits] = self.depths.get(visits, 0) + 1
+        if visits > self.maxdepth:
+            self.maxdepth = visits
+
+    def __str__(self):
+        """ Return the counts, one line per kind of operation, then the histogram. """
+        lines = []
+        for operation in TreeStats.OPERATIONS:
+            calls = self.calls[operation]
+            line = operation + ': ' + str(calls) + ' calls'
+            if calls > 0:
+                line += '; ' + str(round(self.comparisons[operation] / calls, 2)) + ' comparisons'
+                line += ' and ' + str(round(self.visits[operation] / calls, 2)) + ' nodes per call'
+            lines.append(line)
+        lines.append('longest path = ' + str(self.maxdepth))
+        histogram = []
+        for depth in sorted(self.depths):
+            histogram.append(str(depth) + ':' + str(self.depths[depth]))
+        lines.append('path lengths: ' + ' '.join(histogram))
+        return '\n'.join(lines)
+
+
+class _CountingNode:
+    """ Counting versions of the BSTNode searching, adding and removing methods.
+
+    Only used as the first base of the classes made by BSTNode.counting,
+    which set treestats.
+    """
+
+    __slots__ = ()
+
+    treestats = None
+
+    def _find(self, key):
+        """ (Private) As BSTNode._find, counting the comparisons and nodes visited.
+
+        The counts are left in treestats.pending for the caller to record.
+        """
+        comparisons = 0
+        visits = 0
+        candidate = None
+        current = self
+        while current is not None:
+            visits += 1
+            comparisons += 1
+            if key < current._key:
+                current = current._leftchild
+            else:
+                candidate = current
+                current = current._rightchild
+        found = None
+        if candidate is not None:
+            comparisons += 1
+            if candidate._key == key:
+                found = candidate
+        self.treestats.pending = (comparisons, visits)
+        return found
+
+    def search_key(self, key):
+        """ As BSTNode.search_key, recording a search. """
+        found = super().search_key(key)
+        self.treestats.record('search', *self.treestats.pending)
+        return found
+
+    def search_many(self, keys):
+        """ As BSTNode.search_many, recording a search for each key.
+
+        The keys are searched for one at a time, so that each is counted
+        just as search_key would count it: the shared walk of the batched
+        search has no path of its own to put in the counts.
+        """
+        return [self.search_key(key) for key in keys]
+
+    def remove_key(self, key):
+        """ As BSTNode.remove_key, recording the search for the node to remove. """
+        removed = super().remove_key(key)
+        self.treestats.record('remove', *self.treestats.pending)
+        return removed
+
+    def _addpoint(self, key):
+        """ (Private) As BSTNode._addpoint, counting the comparisons and nodes visited.
+
+        The nodes visited are the path from here down to the node found,
+        counted back up its parents. Each of them took two comparisons,
+        except a node already holding key, which took one. The counts are
+        left in treestats.pending for the caller to record.
+        """
+        node, right = super()._addpoint(key)
+        visits = 1
+        current = node
+        while current is not self:
+            visits += 1
+            current = current._parent
+        comparisons = 2 * visits
+        if right is None:
+            comparisons -= 1
+        self.treestats.pending = (comparisons, visits)
+        return node, right
+
+    def add(self, obj):
+        """ As BSTNode.add, recording an add. """
+        added = super().add(obj)
+        self.treestats.record('add', *self.treestats.pending)
+        return added
+
+
 # BSTNode._testadd()
 # print('++++++++++')
 # BSTNode._test()
+# print('++++++++++')
+# AVLNode._test()
@@ -0,0 +1,476 @@
+""" Class definition for a B-tree, as an ordered index for MovieLib.
+
+Each node holds up to order - 1 elements and order children, with the
+keys of its elements in a sorted list that is searched with bisect. A
+lookup in n elements reads about log(n) / log(order) nodes: three for the
+44k titles in movies.txt with the default order, against about 17 levels
+of an AVL tree. Every node also counts the elements in its subtree, for
+rank and select.
+
+A BTree has the methods of an index (see Backends.py). MovieLib uses one
+with backend='btree'; for another fan-out give it a class that sets the
+order, such as functools.partial(BTree, order=128).
+"""
+
+from bisect import bisect_left
+
+DEFAULT_ORDER = 64
+
+
+class BTreeNode:
+    """ A node of a BTree: its keys, elements and children, and its subtree size. """
+
+    __slots__ = ('keys', 'items', 'children', 'size')
+
+    def __init__(self, keys, items, children=None):
+        """ Initialise a node; children is None for a leaf. """
+        self.keys = keys
+        self.items = items
+        self.children = children
+        self.size = len(keys)
+        if children is not None:
+            for child in children:
+                self.size += child.size
+
+    def __str__(self):
+        """ Return an in-order string of this node's subtree.
+
+        Each element is in brackets, as for BSTNode, and each node is
+        wrapped in one more pair.
+        """
+        parts = ['(']
+        for i in range(len(self.items)):
+            if self.children is not None:
+                parts.append(str(self.children[i]))
+            parts.append('(' + str(self.items[i]) + ')')
+        if self.children is not None:
+            parts.append(str(self.children[-1]))
+        parts.append(')')
+        return ''.join(parts)
+
+
+class BTree:
+    """ A B-tree of elements, kept in order of key(element). """
+
+    def __init__(self, key=None, order=DEFAULT_ORDER):
+        """ Initialise an empty tree.
+
+        Args:
+            key - a function giving the sort key of an element; defaults
+                  to str (as for BSTNode)
+            order - the most children a node can have (at least 3)
+        """
+        if order < 3:
+            raise ValueError('a B-tree needs an order of at least 3')
+        if key is None:
+            key = str
+        self._keyfunc = key
+        self.order = order
+        self._maxkeys = order - 1
+        self._minkeys = (order - 1) // 2
+        self.root = None
+
+    def __str__(self):
+        """ Return an in-order string of the tree (see BTreeNode.__str__). """
+        if self.root is None:
+            return ''
+        return str(self.root)
+
+    __repr__ = __str__
+
+    # ADDING ELEMENTS
+
+    def bulk_load(self, items):
+        """ Replace the contents with items, sorted by key with no repeats.
+
+        Builds the tree directly, in O(n), with every node as full as the
+        number of items allows.
+        """
+        items = list(items)
+        if not items:
+            self.root = None
+            return
+        keys = [self._keyfunc(item) for item in items]
+        height = 0
+        capacity = self._maxkeys  # the most elements a tree of this height holds
+        while capacity < len(items):
+            height += 1
+            capacity = (capacity + 1) * self.order - 1
+        self.root = self._build(keys, items, 0, len(items), height)
+
+    def _build(self, keys, items, lo, hi, height):
+        """ (Private) Return a subtree of the given height holding items[lo:hi]. """
+        if height == 0:
+            return BTreeNode(keys[lo:hi], items[lo:hi])
+        # the fewest children that can hold the items, sharing them out evenly
+        childcapacity = (self.order ** height) - 1
+        count = -(-(hi - lo + 1) // (childcapacity + 1))
+        share = hi - lo - (count - 1)
+        nodekeys = []
+        nodeitems = []
+        children = []
+        start = lo
+        for i in range(count):
+            end = start + share // count + (1 if i < share % count else 0)
+            children.append(self._build(keys, items, start, end, height - 1))
+            if i < count - 1:
+                nodekeys.append(keys[end])
+                nodeitems.append(items[end])
+                end += 1
+            start = end
+        return BTreeNode(nodekeys, nodeitems, children)
+
+    def add(self, obj):
+        """ Add obj to the tree.
+
+        Returns obj, or None if an element with the same key was already there.
+        """
+        key = self._keyfunc(obj)
+        if self.root is None:
+            self.root = BTreeNode([key], [obj])
+            return obj
+        path = []
+        node = self.root
+        while True:
+            i = bisect_left(node.keys, key)
+            if i < len(node.keys) and node.keys[i] == key:
+                return None
+            if node.children is None:
+                break
+            path.append((node, i))
+            node = node.children[i]
+        node.keys.insert(i, key)
+        node.items.insert(i, obj)
+        node.size += 1
+        for above, _ in path:
+            above.size += 1
+
+        # split full nodes, from the leaf upwards
+        while len(node.keys) > self._maxkeys:
+            middle = len(node.keys) // 2
+            right = BTreeNode(node.keys[middle + 1:], node.items[middle + 1:],
+                              None if node.children is None else node.children[middle + 1:])
+            middlekey = node.keys[middle]
+            middleitem = node.items[middle]
+            del node.keys[middle:]
+            del node.items[middle:]
+            if node.children is not None:
+                del node.children[middle + 1:]
+            node.size -= right.size + 1
+            if not path:
+                self.root = BTreeNode([middlekey], [middleitem], [node, right])
+                break
+            parent, i = path.pop()
+            parent.keys.insert(i, middlekey)
+            parent.items.insert(i, middleitem)
+            parent.children.insert(i + 1, right)
+            node = parent
+        return obj
+
+    # SEARCHING
+
+    def search(self, searchitem):
+        """ Return the element matching searchitem, or None. """
+        return self.search_key(self._keyfunc(searchitem))
+
+    def search_key(self, key):
+        """ Return the element whose key is key, or None. """
+        node = self.root
+        while node is not None:
+            i = bisect_left(node.keys, key)
+            if i < len(node.keys) and node.keys[i] == key:
+                return node.items[i]
+            if node.children is None:
+                return None
+            node = node.children[i]
+        return None
+
+    def search_many(self, keys):
+        """ Return a list of the elements whose keys are keys (None where missing).
+
+        The keys are sorted and looked up together in one walk down the
+        tree. At each node it visits, the walk splits them into runs that
+        go to the same child, and only goes into the children with a run.
+        """
+        queries = sorted(set(keys))
+        found = {}
+        # each task is (node, lo, hi): queries[lo:hi] can only be at or below node
+        tasks = []
+        if self.root is not None and queries:
+            tasks.append((self.root, 0, len(queries)))
+        while tasks:
+            node, lo, hi = tasks.pop()
+            nodekeys = node.keys
+            while lo < hi:
+                i = bisect_left(nodekeys, queries[lo])
+                end = hi
+                if i < len(nodekeys):
+                    # the queries up to this key go to the same child
+                    end = bisect_left(queries, nodekeys[i], lo, hi)
+                if lo < end and node.children is not None:
+                    tasks.append((node.children[i], lo, end))
+                if end < hi and queries[end] == nodekeys[i]:
+                    found[nodekeys[i]] = node.items[i]
+                    end += 1
+                lo = end
+        return [found.get(key) for key in keys]
+
+    # TRAVERSING
+
+    def __iter__(self):
+        """ Yield the elements of the tree, in order. """
+        return self.items()
+
+    def items(self, lo=None, hi=None):
+        """ Yield the elements from key lo (inclusive) up to hi (exclusive), in order.
+
+        Either bound can be None for no bound, as for BSTNode.items.
+        """
+        # each entry is [node, index of the next element to yield]
+        stack = []
+        node = self.root
+        while node is not None:
+            i = 0
+            if lo is not None:
+                i = bisect_left(node.keys, lo)
+            stack.append([node, i])
+            node = None if node.children is None else node.children[i]
+        while stack:
+            top = stack[-1]
+            node, i = top
+            if i == len(node.keys):
+                stack.pop()
+                continue
+            if hi is not None and not node.keys[i] < hi:
+                return
+            yield node.items[i]
+            top[1] = i + 1
+            child = None if node.children is None else node.children[i + 1]
+            while child is not None:
+                stack.append([child, 0])
+                child = None if child.children is None else child.children[0]
+
+    # REMOVING ELEMENTS
+
+    def remove(self, searchitem):
+        """ Remove and return the element matching searchitem, if there. """
+        return self.remove_key(self._keyfunc(searchitem))
+
+    def remove_key(self, key):
+        """ Remove the element whose key is key from the tree, and return it.
+
+        Returns None if key is not in the tree.
+        """
+        path = []
+        node = self.root
+        while node is not None:
+            i = bisect_left(node.keys, key)
+            if i < len(node.keys) and node.keys[i] == key:
+                break
+            if node.children is None:
+                return None
+            path.append((node, i))
+            node = node.children[i]
+        if node is None:
+            return None
+        removed = node.items[i]
+
+        if node.children is None:
+            del node.keys[i]
+            del node.items[i]
+        else:
+            # replace it with the largest element before it, from a leaf
+            found = node
+            path.append((node, i))
+            node = node.children[i]
+            while node.children is not None:
+                path.append((node, len(node.children) - 1))
+                node = node.children[-1]
+            found.keys[i] = node.keys.pop()
+            found.items[i] = node.items.pop()
+        node.size -= 1
+        for above, _ in path:
+            above.size -= 1
+
+        # refill nodes left with too few elements, from the leaf upwards
+        while path and len(node.keys) < self._minkeys:
+            parent, i = path.pop()
+            self._refill(parent, i)
+            node = parent
+        if not self.root.keys:
+            if self.root.children is None:
+                self.root = None
+            else:
+                self.root = self.root.children[0]
+        return removed
+
+    def _refill(self, parent, i):
+        """ (Private) Give child i of parent enough elements again.
+
+        Moves one element over from a sibling that can spare one, through
+        parent; otherwise merges the child with a sibling.
+        """
+        node = parent.children[i]
+        if i > 0 and len(parent.children[i - 1].keys) > self._minkeys:
+            left = parent.children[i - 1]
+            node.keys.insert(0, parent.keys[i - 1])
+            node.items.insert(0, parent.items[i - 1])
+            parent.keys[i - 1] = left.keys.pop()
+            parent.items[i - 1] = left.items.pop()
+            moved = 0
+            if left.children is not None:
+                child = left.children.pop()
+                node.children.insert(0, child)
+                moved = child.size
+            left.size -= moved + 1
+            node.size += moved + 1
+        elif i + 1 < len(parent.children) and len(parent.children[i + 1].keys) > self._minkeys:
+            right = parent.children[i + 1]
+            node.keys.append(parent.keys[i])
+            node.items.append(parent.items[i])
+            parent.keys[i] = right.keys.pop(0)
+            parent.items[i] = right.items.pop(0)
+            moved = 0
+            if right.children is not None:
+                child = right.children.pop(0)
+                node.children.append(child)
+                moved = child.size
+            right.size -= moved + 1
+            node.size += moved + 1
+        else:
+            if i > 0:
+                i -= 1  # merge with the left sibling instead
+            left = parent.children[i]
+            right = parent.children[i + 1]
+            left.keys.append(parent.keys.pop(i))
+            left.items.append(parent.items.pop(i))
+            left.keys.extend(right.keys)
+            left.items.extend(right.items)
+            if left.children is not None:
+                left.children.extend(right.children)
+            left.size += right.size + 1
+            del parent.children[i + 1]
+
+    # MISC CODE
+
+    def findmaxnode(self):
+        """ Return the maximal element in the tree. """
+        node = self.root
+        while node.children is not None:
+            node = node.children[-1]
+        return node.items[-1]
+
+    def height(self):
+        """ Return the height of the tree, counted in nodes (-1 when empty). """
+        height = -1
+        node = self.root
+        while node is not None:
+            height += 1
+            node = None if node.children is None else node.children[0]
+        return height
+
+    def size(self):
+        """ Return the number of elements in the tree. """
+        if self.root is None:
+            return 0
+        return self.root.size
+
+    def rank(self, key):
+        """ Return the number of elements with keys before key. """
+        rank = 0
+        node = self.root
+        while node is not None:
+            i = bisect_left(node.keys, key)
+            rank += i
+            if node.children is None:
+                break
+            for child in node.children[:i]:
+                rank += child.size
+            if i < len(node.keys) and node.keys[i] == key:
+                return rank + node.children[i].size
+            node = node.children[i]
+        return rank
+
+    def select(self, k):
+        """ Return the element at (zero-based) position k in order, or None. """
+        if k < 0 or k >= self.size():
+            return None
+        node = self.root
+        while node.children is not None:
+            for i in range(len(node.keys)):
+                childsize = node.children[i].size
+                if k < childsize:
+                    break
+                k -= childsize
+                if k == 0:
+                    return node.items[i]
+                k -= 1
+            else:
+                i = len(node.keys)
+            node = node.children[i]
+        return node.items[k]
+
+    def _stats(self):
+        """ Return the basic stats on the tree. """
+        return 'size = ' + str(self.size()) + '; height = ' + str(self.height())
+
+    def _properBST(self):
+        """ Return True if the tree is a proper B-tree; False otherwise.
+
+        Checks that keys match their elements and are in order, that nodes
+        are neither too full nor (apart from the root) too empty, that
+        every leaf is at the same depth, and that every size is right.
+        """
+        if self.root is None:
+            return True
+        leafdepth = None
+        # each entry is (node, lo, hi, depth), with lo < every key < hi
+        stack = [(self.root, None, None, 0)]
+        while stack:
+            node, lo, hi, depth = stack.pop()
+            keys = node.keys
+            if len(keys) != len(node.items) or len(keys) > self._maxkeys:
+                return False
+            if node is not self.root and len(keys) < self._minkeys:
+                return False
+            bounds = [lo] + keys + [hi]
+            for i in range(len(bounds) - 1):
+                if bounds[i] is not None and bounds[i + 1] is not None \
+                        and not bounds[i] < bounds[i + 1]:
+                    return False
+            for i in range(len(keys)):
+                if keys[i] != self._keyfunc(node.items[i]):
+                    return False
+            size = len(keys)
+            if node.children is None:
+                if leafdepth is None:
+                    leafdepth = depth
+                elif depth != leafdepth:
+                    return False
+            else:
+                if len(node.children) != len(keys) + 1:
+                    return False
+                for i in range(len(node.children)):
+                    size += node.children[i].size
+                    stack.append((node.children[i], bounds[i], bounds[i + 1], depth + 1))
+            if size != node.size:
+                return False
+        return True
+
+    @staticmethod
+    def _test():
+        tree = BTree(order=3)
+        for name in "MFTBHPWACKRS":
+            print('adding', name)
+            tree.add(name)
+            print('Ordered:', tree)
+        print(tree._stats())
+        print('proper B-tree:', tree._properBST())
+        for name in "FMAZTBW":
+            print('removing', name, '->', tree.remove(name))
+            print('Ordered:', tree)
+            print('proper B-tree:', tree._properBST())
+        print('rank of P:', tree.rank('P'), '; element 2:', tree.select(2))
+
+
+# BTree._test()
@@ -0,0 +1,464 @@
+""" Ordered index backends for MovieLib.
+
+An ordered index holds items (Movies, or Versions of a title) under keys
+given by a key function, and every backend has the same methods:
+
+    add(item)            add item; return it, or None if its key is there
+    search_key(key)      return the item with key, or None
+    search_many(keys)    return a list of the items with keys (None where
+                         missing), in the same order, found together
+    remove_key(key)      remove and return the item with key, or None
+    bulk_load(items)     replace the contents with items, already sorted
+                         by key with no repeated keys
+    items(lo, hi)        yield the items with lo <= key < hi, in key order
+                         (either bound can be None)
+    __iter__()           yield every item, in key order
+    size()               the number of items
+    rank(key)            the number of items with keys before key
+    select(k)            the item at zero-based position k, or None
+    height()             the height of the structure (-1 when empty)
+    __str__()            an in-order string, as for BSTNode
+    _stats()             size and height, as a string
+    _properBST()         True if the structure is internally consistent
+
+The BSTNode and AVLNode backends can also count the work done by their
+operations: see BSTIndex.enable_stats. The persistent backend can also
+hand out snapshot() copies of itself in O(1), for readers that must not
+see later changes (see PersistentBST.py).
+
+A MovieLib picks one by name (see BACKENDS), or can be given any class
+whose instances are made with the key function and have these methods,
+such as functools.partial(BTree, order=128) for a B-tree of another order.
+"""
+
+from bisect import bisect_left
+
+from ArrayBST import ArrayBST
+from BST import AVLNode, BSTNode, TreeStats
+from BTree import BTree
+from PersistentBST import PersistentBST
+
+
+def implicit_tree_str(count, label):
+    """ Return the in-order string of a perfectly balanced tree of count items.
+
+    The tree is the one BSTNode.from_sorted builds, where the root of
+    items lo:hi is item (lo + hi) // 2. label(i) gives the string for
+    item number i.
+    """
+    if count == 0:
+        return ''
+    traversal = []
+    # entries are either (lo, hi) ranges still to expand, or strings
+    stack = [(0, count)]
+    while stack:
+        entry = stack.pop()
+        if isinstance(entry, str):
+            traversal.append(entry)
+            continue
+        lo, hi = entry
+        mid = (lo + hi) // 2
+        if mid + 1 < hi:
+            stack.append(')')
+            stack.append((mid + 1, hi))
+        stack.append('(' + label(mid) + ')')
+        if lo < mid:
+            stack.append((lo, mid))
+            stack.append('(')
+    return ''.join(traversal)
+
+
+class BSTIndex:
+    """ An ordered index kept in a BST of BSTNodes (not self-balancing). """
+
+    nodeclass = BSTNode
+
+    def __init__(self, key):
+        """ Initialise an empty index whose items have keys key(item). """
+        self._keyfunc = key
+        self.root = None
+        self.stats = None
+
+    def __str__(self):
+        """ Return an in-order string of the tree. """
+        if self.root is None:
+            return ''
+        return str(self.root)
+
+    __repr__ = __str__
+
+    def __iter__(self):
+        """ Yield every item in key order. """
+        return self.items()
+
+    def add(self, item):
+        """ Add item; return it, or None if its key was already there. """
+        if self.root is None:
+            self.root = self.nodeclass(item, self._keyfunc)
+            if self.stats is not None:
+                self.stats.record('add', 0, 0)
+            return item
+        return self.root.add(item)
+
+    def search_key(self, key):
+        """ Return the item with key, or None. """
+        if self.root is None:
+            return None
+        return self.root.search_key(key)
+
+    def search_many(self, keys):
+        """ Return a list of the items with keys, with None where missing. """
+        if self.root is None:
+            return [None] * len(keys)
+        return self.root.search_many(keys)
+
+    def remove_key(self, key):
+        """ Remove and return the item with key, or None. """
+        if self.root is None:
+            return None
+        if self.root.leaf():
+            # the root node can't unlink itself, so empty the tree here
+            if self.stats is not None:
+                self.stats.record('remove', 2, 1)
+            if self._keyfunc(self.root.element) != key:
+                return None
+            removed = self.root.element
+            self.root = None
+            return removed
+        return self.root.remove_key(key)
+
+    def bulk_load(self, items):
+        """ Replace the contents with items, sorted by key with no repeats. """
+        self.root = self.nodeclass.from_sorted(items, self._keyfunc)
+
+    def items(self, lo=None, hi=None):
+        """ Yield the items with lo <= key < hi, in key order. """
+        if self.root is None:
+            return iter(())
+        return self.root.items(lo, hi)
+
+    def size(self):
+        """ Return the number of items. """
+        if self.root is None:
+            return 0
+        return self.root.size()
+
+    def rank(self, key):
+        """ Return the number of items with keys before key. """
+        if self.root is None:
+            return 0
+        return self.root.rank(key)
+
+    def select(self, k):
+        """ Return the item at zero-based position k in key order, or None. """
+        if self.root is None:
+            return None
+        return self.root.select(k)
+
+    def height(self):
+        """ Return the height of the tree. """
+        if self.root is None:
+            return -1
+        return self.root.height()
+
+    def enable_stats(self, stats=None):
+        """ Start counting the work of each add, search and remove; return the TreeStats.
+
+        Args:
+            stats - a TreeStats to add the counts to, or None for a new one
+
+        Until this is called the tree's nodes are plain BSTNodes (or
+        AVLNodes), which count nothing and pay nothing for it.
+        """
+        if not issubclass(type(self).nodeclass, BSTNode):
+            raise ValueError(type(self).nodeclass.__name__ + " trees can't count their work")
+        if stats is None:
+            stats = TreeStats()
+        self.stats = stats
+        self.nodeclass = type(self).nodeclass.counting(stats)
+        if self.root is not None:
+            self.root._setclass(self.nodeclass)
+        return stats
+
+    def disable_stats(self):
+        """ Stop counting, and return the tree's nodes to their plain class. """
+        if self.stats is None:
+            return
+        self.stats = None
+        del self.nodeclass  # back to the class attribute
+        if self.root is not None:
+            self.root._setclass(self.nodeclass)
+
+    def _stats(self):
+        """ Return the basic stats on the index, and the operation counts if kept. """
+        stats = 'size = ' + str(self.size()) + '; height = ' + str(self.height())
+        if self.stats is not None:
+            stats += '\n' + str(self.stats)
+        return stats
+
+    def _properBST(self):
+        """ Return True if the tree is a proper BST. """
+        if self.root is None:
+            return True
+        return self.root._properBST()
+
+
+class AVLIndex(BSTIndex):
+    """ An ordered index kept in an AVL tree of AVLNodes. """
+
+    nodeclass = AVLNode
+
+
+class ArrayBSTIndex(BSTIndex):
+    """ An ordered index kept in an ArrayBST (not self-balancing). """
+
+    nodeclass = ArrayBST
+
+
+class SortedArrayIndex:
+    """ An ordered index kept as two parallel lists sorted by key.
+
+    Searches use bisect, so they are O(log n) with no objects per item
+    beyond the two list slots; add and remove shift the lists, so they are
+    O(n), but the shifting is a single memory move.
+    """
+
+    def __init__(self, key):
+        """ Initialise an empty index whose items have keys key(item). """
+        self._keyfunc = key
+        self._keys = []
+        self._items = []
+
+    def __str__(self):
+        """ Return an in-order string, as if of a perfectly balanced tree. """
+        return implicit_tree_str(len(self._items), lambda i: str(self._items[i]))
+
+    __repr__ = __str__
+
+    def __iter__(self):
+        """ Yield every item in key order. """
+        return iter(self._items)
+
+    def add(self, item):
+        """ Add item; return it, or None if its key was already there. """
+        key = self._keyfunc(item)
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return None
+        self._keys.insert(i, key)
+        self._items.insert(i, item)
+        return item
+
+    def search_key(self, key):
+        """ Return the item with key, or None. """
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._items[i]
+        return None
+
+    def search_many(self, keys):
+        """ Return a list of the items with keys, with None where missing.
+
+        The keys are found in sorted order, each search starting where the
+        one before it ended.
+        """
+        found = {}
+        start = 0
+        for key in sorted(set(keys)):
+            start = bisect_left(self._keys, key, start)
+            if start < len(self._keys) and self._keys[start] == key:
+                found[key] = self._items[start]
+        return [found.get(key) for key in keys]
+
+    def remove_key(self, key):
+        """ Remove and return the item with key, or None. """
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+            return self._items.pop(i)
+        return None
+
+    def bulk_load(self, items):
+        """ Replace the contents with items, sorted by key with no repeats. """
+        self._items = list(items)
+        self._keys = [self._keyfunc(item) for item in self._items]
+
+    def items(self, lo=None, hi=None):
+        """ Yield the items with lo <= key < hi, in key order. """
+        start = 0
+        end = len(self._keys)
+        if lo is not None:
+            start = bisect_left(self._keys, lo)
+        if hi is not None:
+            end = bisect_left(self._keys, hi)
+        for i in range(start, end):
+            yield self._items[i]
+
+    def size(self):
+        """ Return the number of items. """
+        return len(self._items)
+
+    def rank(self, key):
+        """ Return the number of items with keys before key. """
+        return bisect_left(self._keys, key)
+
+    def select(self, k):
+        """ Return the item at zero-based position k in key order, or None. """
+        if k < 0 or k >= len(self._items):
+            return None
+        return self._items[k]
+
+    def height(self):
+        """ Return the height of the implicit binary search tree. """
+        return len(self._items).bit_length() - 1
+
+    def _stats(self):
+        """ Return the basic stats on the index. """
+        return 'size = ' + str(self.size()) + '; height = ' + str(self.height())
+
+    def _properBST(self):
+        """ Return True if the keys match the items and are strictly increasing. """
+        if len(self._keys) != len(self._items):
+            return False
+        for i in range(len(self._keys)):
+            if self._keys[i] != self._keyfunc(self._items[i]):
+                return False
+            if i > 0 and not self._keys[i - 1] < self._keys[i]:
+                return False
+        return True
+
+
+class HashIndex:
+    """ An index kept in a hash table (a dict from key to item).
+
+    add, search_key and remove_key are O(1) on average. The table has no
+    order, so the ordered methods (items, rank, select, ...) sort the keys
+    the first time they are needed after a change: O(n log n) once, then
+    O(log n) each until the next add or remove.
+    """
+
+    def __init__(self, key):
+        """ Initialise an empty index whose items have keys key(item). """
+        self._keyfunc = key
+        self._table = {}
+        self._sorted = None  # the keys in order, or None if out of date
+
+    def __str__(self):
+        """ Return an in-order string, as if of a perfectly balanced tree. """
+        keys = self._sortedkeys()
+        return implicit_tree_str(len(keys), lambda i: str(self._table[keys[i]]))
+
+    __repr__ = __str__
+
+    def __iter__(self):
+        """ Yield every item in key order. """
+        return self.items()
+
+    def _sortedkeys(self):
+        """ (Private) Return the keys in order, sorting them if need be. """
+        if self._sorted is None:
+            self._sorted = sorted(self._table)
+        return self._sorted
+
+    def add(self, item):
+        """ Add item; return it, or None if its key was already there. """
+        key = self._keyfunc(item)
+        if key in self._table:
+            return None
+        self._table[key] = item
+        self._sorted = None
+        return item
+
+    def search_key(self, key):
+        """ Return the item with key, or None. """
+        return self._table.get(key)
+
+    def search_many(self, keys):
+        """ Return a list of the items with keys, with None where missing. """
+        return [self._table.get(key) for key in keys]
+
+    def remove_key(self, key):
+        """ Remove and return the item with key, or None. """
+        if key not in self._table:
+            return None
+        self._sorted = None
+        return self._table.pop(key)
+
+    def bulk_load(self, items):
+        """ Replace the contents with items, sorted by key with no repeats. """
+        self._table = {}
+        for item in items:
+            self._table[self._keyfunc(item)] = item
+        self._sorted = list(self._table)
+
+    def items(self, lo=None, hi=None):
+        """ Yield the items with lo <= key < hi, in key order. """
+        keys = self._sortedkeys()
+        start = 0
+        end = len(keys)
+        if lo is not None:
+            start = bisect_left(keys, lo)
+        if hi is not None:
+            end = bisect_left(keys, hi)
+        for i in range(start, end):
+            yield self._table[keys[i]]
+
+    def size(self):
+        """ Return the number of items. """
+        return len(self._table)
+
+    def rank(self, key):
+        """ Return the number of items with keys before key. """
+        return bisect_left(self._sortedkeys(), key)
+
+    def select(self, k):
+        """ Return the item at zero-based position k in key order, or None. """
+        keys = self._sortedkeys()
+        if k < 0 or k >= len(keys):
+            return None
+        return self._table[keys[k]]
+
+    def height(self):
+        """ Return 0 (there is no tree), or -1 if the index is empty. """
+        if not self._table:
+            return -1
+        return 0
+
+    def _stats(self):
+        """ Return the basic stats on the index. """
+        return 'size = ' + str(self.size()) + '; height = ' + str(self.height())
+
+    def _properBST(self):
+        """ Return True if every item is stored under its own key. """
+        for key in self._table:
+            if self._keyfunc(self._table[key]) != key:
+                return False
+        return True
+
+
+# the backends a MovieLib can be given by name
+BACKENDS = {
+    'bst': BSTIndex,
+    'avl': AVLIndex,
+    'arraybst': ArrayBSTIndex,
+    'sorted': SortedArrayIndex,
+    'hash': HashIndex,
+    'btree': BTree,
+    'persistent': PersistentBST,
+}
+
+
+def make_index(backend, key):
+    """ Return a new, empty index.
+
+    Args:
+        backend - a name from BACKENDS, or an index class (anything that
+                  makes an index when called with the key function)
+        key - the key function for the index
+    """
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError('unknown backend ' + repr(backend) + '; choose from '
+                             + ', '.join(sorted(BACKENDS)))
+        backend = BACKENDS[backend]
+    return backend(key)
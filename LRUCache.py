@@ -0,0 +1,153 @@
+""" Class definition for a bounded least-recently-used cache.
+
+The cache is a hash map from each key to a node of a doubly linked list,
+which keeps the entries in order of use, most recent first. A lookup
+finds the node through the map and moves it to the front; adding to a
+full cache drops the node at the back. Everything is O(1).
+"""
+
+MISSING = object()  # returned by get for a key that isn't cached
+
+
+class DLLNode:
+    """ A node of the cache's doubly linked list: one cached key and value. """
+
+    __slots__ = ('key', 'value', 'prev', 'next')
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.prev = None
+        self.next = None
+
+
+class LRUCache:
+    """ A map of at most capacity entries, dropping the least recently used.
+
+    Counts its hits, misses and evictions.
+    """
+
+    def __init__(self, capacity):
+        """ Initialise an empty cache holding up to capacity entries. """
+        if capacity < 1:
+            raise ValueError('an LRU cache needs a capacity of at least 1')
+        self.capacity = capacity
+        self._map = {}
+        # a sentinel node: _head.next is the most recently used entry and
+        # _head.prev the least, so the list never has to check for ends
+        self._head = DLLNode(None, None)
+        self._head.prev = self._head
+        self._head.next = self._head
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __str__(self):
+        """ Return the cached keys, most recently used first. """
+        out = ''
+        node = self._head.next
+        while node is not self._head:
+            out += '<-' + str(node.key)
+            node = node.next
+        return out + '-|'
+
+    __repr__ = __str__
+
+    def __len__(self):
+        """ Return the number of entries. """
+        return len(self._map)
+
+    def __contains__(self, key):
+        """ Return True if key is cached (without counting it as a use). """
+        return key in self._map
+
+    # THE LINKED LIST
+
+    def _unlink(self, node):
+        """ (Private) Take node out of the list. """
+        node.prev.next = node.next
+        node.next.prev = node.prev
+
+    def _push_front(self, node):
+        """ (Private) Put node at the front of the list, as the most recent. """
+        node.prev = self._head
+        node.next = self._head.next
+        self._head.next.prev = node
+        self._head.next = node
+
+    # THE MAP
+
+    def get(self, key, default=MISSING):
+        """ Return the value cached for key, or default if there is none.
+
+        A hit makes key the most recently used entry.
+        """
+        node = self._map.get(key)
+        if node is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        if self._head.next is not node:
+            self._unlink(node)
+            self._push_front(node)
+        return node.value
+
+    def put(self, key, value):
+        """ Cache value for key, as the most recently used entry.
+
+        If the cache was full, the least recently used entry is dropped.
+        """
+        node = self._map.get(key)
+        if node is not None:
+            node.value = value
+            self._unlink(node)
+            self._push_front(node)
+            return
+        if len(self._map) >= self.capacity:
+            oldest = self._head.prev
+            self._unlink(oldest)
+            del self._map[oldest.key]
+            self.evictions += 1
+        node = DLLNode(key, value)
+        self._map[key] = node
+        self._push_front(node)
+
+    def discard(self, key):
+        """ Drop the entry for key, if there is one. """
+        node = self._map.pop(key, None)
+        if node is not None:
+            self._unlink(node)
+
+    def clear(self):
+        """ Drop every entry (the counters are kept). """
+        self._map = {}
+        self._head.prev = self._head
+        self._head.next = self._head
+
+    def _stats(self):
+        """ Return the size and counters of the cache. """
+        looked = self.hits + self.misses
+        outstr = 'cache: ' + str(len(self._map)) + '/' + str(self.capacity) + ' entries; '
+        outstr += str(self.hits) + ' hits, ' + str(self.misses) + ' misses'
+        if looked > 0:
+            outstr += ' (' + str(round(100 * self.hits / looked, 1)) + '% hits)'
+        outstr += ', ' + str(self.evictions) + ' evictions'
+        return outstr
+
+    @staticmethod
+    def _test():
+        cache = LRUCache(3)
+        for key in "ABC":
+            cache.put(key, key.lower())
+        print(cache)
+        print('get A should be a, and is', cache.get('A'))
+        print(cache)
+        cache.put('D', 'd')
+        print('B was least recently used, so is dropped:', cache)
+        print('get B should be MISSING:', cache.get('B') is MISSING)
+        cache.discard('C')
+        print(cache)
+        print(cache._stats())
+
+
+# LRUCache._test()
@@ -0,0 +1,128 @@
+""" A read-only tree of the titles in a movie file, searched in place with mmap.
+
+Opening a LazyFileBST scans the file once for line breaks and tabs, and
+sorts its lines by title. All it keeps is one array of the byte offsets
+where the lines start, in title order (and, when a title may have several
+lines, one more array of where each title's lines start in the first).
+Nothing is made per movie until it is asked for: then its line is read
+from the mapped file and parsed. UTF-8 bytes sort in the same order as
+the strings they encode, so the lines are sorted and searched by the raw
+bytes of their titles.
+
+build_library(lazy=True) uses one as the index of the library it returns.
+"""
+
+from array import array
+import mmap
+import os
+
+from Snapshot import SnapshotBST
+
+
+class LazyFileBST(SnapshotBST):
+    """ A SnapshotBST reading the lines of a tab-separated movie file.
+
+    Has the reading methods of an index (search_key, rank, select, items,
+    ...; see Backends.py), so a MovieLib can use one until it is first
+    changed. Each line must start with a title and a tab, and end in \\n
+    or \\r\\n (or the end of the file); any other line is skipped.
+    """
+
+    def __init__(self, path, factory, multi=False):
+        """ Open the movie file at path.
+
+        Args:
+            path - a movie file, as read by build_library
+            factory - called as factory(lines), with lines a list of the
+                      lines with one title in file order, to make the
+                      element for that title when it is needed
+            multi - True to keep every line with a title; otherwise only
+                    the first is kept, as MovieLib.add would
+        """
+        file = open(path, 'rb')
+        if os.fstat(file.fileno()).st_size > 0:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = b''  # an empty file can't be mapped
+        file.close()
+        self._factory = factory
+        self.multi = multi
+
+        starts = array('q')
+        start = 0
+        end = len(self._map)
+        while start < end:
+            tab = self._map.find(b'\t', start)
+            newline = self._map.find(b'\n', start)
+            if newline < 0:
+                newline = end
+            if 0 <= tab < newline:
+                starts.append(start)
+            start = newline + 1
+        self.lines = len(starts)
+
+        # sort by title; sorted is stable, so a title's lines stay in file order
+        titles = [self._linetitle(start) for start in starts]
+        order = sorted(range(len(starts)), key=titles.__getitem__)
+        self._starts = array('q')
+        self._rowstarts = None
+        if multi:
+            self._rowstarts = array('i')
+        previous = None
+        for row in order:
+            if titles[row] != previous:
+                if multi:
+                    self._rowstarts.append(len(self._starts))
+                self._starts.append(starts[row])
+                previous = titles[row]
+            elif multi:
+                self._starts.append(starts[row])
+        self._count = len(self._starts)
+        if multi:
+            self._count = len(self._rowstarts)
+            self._rowstarts.append(len(self._starts))
+
+    # READING ROWS
+
+    def _linetitle(self, start):
+        """ (Private) Return the encoded title of the line starting at start. """
+        return self._map[start:self._map.find(b'\t', start)]
+
+    def _line(self, start):
+        """ (Private) Return the line starting at start, without its line break. """
+        end = self._map.find(b'\n', start)
+        if end < 0:
+            end = len(self._map)
+        return self._map[start:end].decode('utf8')
+
+    def _rows(self, i):
+        """ (Private) Return the range of the rows of title number i. """
+        if self._rowstarts is None:
+            return range(i, i + 1)
+        return range(self._rowstarts[i], self._rowstarts[i + 1])
+
+    def _titlebytes(self, i):
+        """ (Private) Return the encoded title number i. """
+        return self._linetitle(self._starts[self._rows(i)[0]])
+
+    def _element(self, i):
+        """ (Private) Make the element for title number i. """
+        return self._factory([self._line(self._starts[row]) for row in self._rows(i)])
+
+    # MISC CODE
+
+    def _stats(self):
+        """ Return the basic stats on the tree, and the number of lines read. """
+        return SnapshotBST._stats(self) + '; lines = ' + str(self.lines)
+
+    @staticmethod
+    def _test():
+        path = 'smallmovies.txt'
+        tree = LazyFileBST(path, list)
+        print('Tree:', tree)
+        print(tree._stats(), '- proper BST:', tree._properBST())
+        print('first title:', tree.select(0))
+        print('rank of M:', tree.rank('M'), '- search for a missing title:', tree.search_key('~'))
+
+
+# LazyFileBST._test()
@@ -1,11 +1,89 @@
+from bisect import insort
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
 from functools import total_ordering
 
-from BST import BSTNode
+import io
+import math
+import os
+
+from Backends import AVLIndex, make_index
+from LazyFile import LazyFileBST
+from LRUCache import MISSING, LRUCache
+from NGram import NGramIndex, fold, ngrams, similarity
+from Snapshot import SnapshotBST, write_snapshot
+from Trie import Trie
+
+
+def parse_date(text):
+    """ Return the day number (see date.toordinal) of a dd/mm/yyyy date.
+
+    Day numbers sort in date order, unlike the dd/mm/yyyy strings.
+    Returns None if text is blank.
+    """
+    text = text.strip()
+    if not text:
+        return None
+    day, month, year = text.split('/')
+    return date(int(year), int(month), int(day)).toordinal()
+
+
+def format_date(day):
+    """ Return a day number as a dd/mm/yyyy string.
+
+    Anything that isn't a day number (such as a date that was never parsed)
+    is just turned into a string.
+    """
+    if not isinstance(day, int):
+        return str(day)
+    return date.fromordinal(day).strftime('%d/%m/%Y')
+
+
+def parse_runtime(text):
+    """ Return a running time in minutes as an int, or None if text is blank. """
+    text = text.strip()
+    if not text:
+        return None
+    return int(text)
+
+
+def _date_key(movie):
+    """ Return the key of movie in a release date index.
+
+    The date and title, then the movie's identity, so that two versions of
+    a title released the same day still have keys of their own.
+    """
+    return movie.date, movie._title, id(movie)
+
+
+def _time_key(movie):
+    """ Return the key of movie in a running time index (unique, as for _date_key). """
+    return movie.time, movie._title, id(movie)
+
+
+def _version_key(movie):
+    """ Return the key of movie among the versions of its title.
+
+    Versions are ordered by release date, with undated ones last.
+    """
+    released = movie.date
+    if released is None:
+        return True, 0
+    return False, released
 
 
 @total_ordering
 class Movie:
-    """ Represents a single Movie. """
+    """ Represents a single Movie.
+
+    build_library stores the date as a day number (see parse_date) and the
+    running time as an int. Movies and BSTNodes have __slots__ rather than
+    a __dict__: measured with tracemalloc, build_library('movies.txt') holds
+    about 245 bytes per unique title (Movie, title string, BSTNode), down
+    from about 410 with string dates and runtimes and no slots.
+    """
+
+    __slots__ = ('_title', '_date', '_time')
 
     def __init__(self, i_title, i_date=None, i_runtime=None):
         """ Initialise a Movie Object. """
@@ -23,8 +101,8 @@ class Movie:
     def full_str(self):
         """ Return a full string representation of this movie. """
         outstr = str(self._title) + ": "
-        outstr = outstr + str(self._date) + "; "
-        outstr = outstr + str(self._time)
+        outstr = outstr + format_date(self.date) + "; "
+        outstr = outstr + str(self.time)
         return outstr
 
     def get_title(self):
@@ -33,31 +111,25 @@ class Movie:
 
     def __eq__(self, other):
         """ Return True if this movie has exactly same title as other. """
-        if other.title == self.title:
-            return True
-        return False
+        return other._title == self._title
 
     def __ne__(self, other):
         """ Return False if this movie has exactly same title as other. """
-        return not (self.title == other.title)
+        return not (self._title == other._title)
 
     def __lt__(self, other):
         """ Return True if this movie is ordered before other.
 
         A movie is less than another if it's title is alphabetically before.
         """
-        if other.title > self.title:
-            return True
-        return False
+        return self._title < other._title
 
     def __gt__(self, other):
         """ Return True if this movie is ordered after other.
 
         A movie is greater than another if it's title is alphabetically after.
         """
-        if other.title > self.title:
-            return False
-        return True
+        return other._title < self._title
 
     def getTitle(self):
         return self._title
@@ -82,15 +154,142 @@ class Movie:
     time = property(getTime, setTime)
 
 
+class Versions:
+    """ All the movies with one title, in release date order.
+
+    These are the elements of the BST in a multi-version MovieLib: one
+    node per title, holding a short list of its versions.
+    """
+
+    __slots__ = ('_title', '_movies')
+
+    def __init__(self, movie):
+        """ Initialise the versions of movie's title, starting with movie. """
+        self._title = movie.title
+        self._movies = [movie]
+
+    def __str__(self):
+        """ Return the title, as a string. """
+        return str(self._title)
+
+    __repr__ = __str__
+
+    def __iter__(self):
+        """ Yield the versions in release date order. """
+        return iter(self._movies)
+
+    def __len__(self):
+        """ Return the number of versions. """
+        return len(self._movies)
+
+    def get_title(self):
+        """ Return the title shared by these versions. """
+        return self._title
+
+    title = property(get_title)
+
+    def first(self):
+        """ Return the earliest version. """
+        return self._movies[0]
+
+    def add(self, movie):
+        """ Add movie (which must have the same title) in date order. """
+        insort(self._movies, movie, key=_version_key)
+
+    def copy(self):
+        """ Return a new Versions holding the same movies. """
+        versions = Versions(self._movies[0])
+        versions._movies = list(self._movies)
+        return versions
+
+
 class MovieLib:
     """ A movie library.
 
-    Implemented using a BST. 
+    Implemented using an ordered index keyed on the movie titles: by
+    default a BST. backend picks another kind of index, by name or by
+    class (see Backends.py): 'bst', 'avl' (an AVL tree, so the library
+    stays O(log n) per operation whatever order the movies are added in),
+    'arraybst' (a BST kept in a few flat columns instead of one object per
+    node), 'btree' (a B-tree of wide nodes, so a lookup reads a few nodes
+    instead of many; see BTree.py), 'persistent' (a BST whose nodes are
+    never changed, so snapshot() can hand readers the library as it is in
+    O(1); see PersistentBST.py), 'sorted' (a sorted array) or 'hash'
+    (a hash table, sorted only when an ordered method needs it).
+    balanced=True is short for backend='avl', and arrays=True for
+    backend='arraybst'.
+
+    With indexed=True the library also keeps two AVL trees of its movies
+    ordered by release date and by running time (with the title to break
+    ties), for released_between, runtime_between and query. Movies with no
+    date or no running time are left out of that index. The dates must be
+    day numbers, as build_library gives (see parse_date); add parses
+    dd/mm/yyyy strings, and refuses any other date.
+
+    With multi=True a movie is kept even if its title is already there, so
+    remakes are not lost. Each title's node holds all of its versions in
+    release date order (see Versions), and search_all returns them with a
+    single search. search, select and remove then work on titles: they
+    give the earliest version, and remove takes out every version. size,
+    rank and select count titles, while iteration, range, prefix and the
+    secondary indexes cover every version.
+
+    With cache=n the results of the last n different titles searched for
+    are kept in an LRU cache (see LRUCache.py), so a popular title is found
+    without searching the index. Adding or removing a title drops just
+    that title from the cache.
+
+    With autocomplete=True the titles are also kept in a radix tree (see
+    Trie.py), so complete finds the first k titles starting with a prefix
+    in O(len(prefix) + k), in title order or ranked by release date,
+    whatever the size of the library.
+
+    With fuzzy=True the titles are also kept in a character n-gram index
+    (see NGram.py), so search_folded finds titles ignoring case, accents
+    and punctuation with one dict lookup, and search_fuzzy finds the
+    titles most like a misspelt or partial one by scoring just the titles
+    that share an n-gram with it.
     """
 
-    def __init__(self):
+    # the secondary indexes: name and key function
+    _INDEXES = (('date', _date_key), ('time', _time_key))
+
+    def __init__(self, balanced=False, arrays=False, indexed=False, multi=False, *,
+                 backend=None, cache=None, autocomplete=False, fuzzy=False):
         """ Initialise a movie library. """
-        self.bst = None
+        if balanced and arrays:
+            raise ValueError("an ArrayBST library can't be balanced")
+        if backend is None:
+            if arrays:
+                backend = 'arraybst'
+            elif balanced:
+                backend = 'avl'
+            else:
+                backend = 'bst'
+        elif balanced or arrays:
+            raise ValueError("give either backend or balanced/arrays, not both")
+        self._backend = backend
+        self._multi = multi
+        if multi:
+            self._keyfunc = Versions.get_title
+        else:
+            self._keyfunc = Movie.get_title
+        self.index = make_index(backend, self._keyfunc)
+        self._opstats = None
+        self._cache = None
+        if cache:
+            self._cache = LRUCache(cache)
+        self._indexes = {}
+        if indexed:
+            for name, keyfunc in MovieLib._INDEXES:
+                self._indexes[name] = AVLIndex(keyfunc)
+        self._trie = None
+        if autocomplete:
+            self._trie = Trie()
+        self._ngrams = None
+        if fuzzy:
+            self._ngrams = NGramIndex()
+        self._follow = None  # (filename, offset) for refresh, once following a file
 
     def __str__(self):
         """ Return a string representation of the library.
@@ -98,14 +297,64 @@ class MovieLib:
         The string will be created by an in-order traversal.
         """
         # method goes here
-        return self.bst.__str__()
+        return self.index.__str__()
 
     __repr__ = __str__
 
+    def __iter__(self):
+        """ Yield the movies in the library in title order, one at a time. """
+        return self._movies(iter(self.index))
+
+    def _movies(self, elements):
+        """ (Private) Return the movies held in some index elements.
+
+        Each element is a Movie, or a Versions in a multi-version library.
+        """
+        if not self._multi:
+            return elements
+        return (movie for versions in elements for movie in versions)
+
+    def _movie(self, element):
+        """ (Private) Return the Movie standing for one index element, or None. """
+        if element is None or not self._multi:
+            return element
+        return element.first()
+
+    def range(self, lo=None, hi=None):
+        """ Yield the movies with titles from lo (inclusive) to hi (exclusive).
+
+        Either bound can be None to leave that end open. Movies are found
+        lazily, so taking the first k costs O(log n + k) on a balanced library.
+        """
+        return self._movies(self.index.items(lo, hi))
+
+    def prefix(self, prefix):
+        """ Yield the movies whose titles start with prefix, in title order. """
+        for movie in self.range(prefix):
+            if not movie.title.startswith(prefix):
+                return
+            yield movie
+
     def size(self):
         """ Return the number of movies in the library. """
         # method goes here
-        return self.bst.size()
+        return self.index.size()
+
+    def rank(self, title):
+        """ Return the number of movies whose titles come before title.
+
+        This is the zero-based position of title in the library, if it is
+        there. Takes O(height) time.
+        """
+        return self.index.rank(title)
+
+    def select(self, k):
+        """ Return the Movie at zero-based position k in title order, or None.
+
+        Takes O(height) time, so select(k) for k in a range gives a page of
+        the library.
+        """
+        return self._movie(self.index.select(k))
 
     def search(self, title):
         """ Return Movie with matching title if there, or None.
@@ -114,35 +363,286 @@ class MovieLib:
             title: a string representing a movie title.
         """
         # method goes here
-        # Note that the BST requires an object to search for, and we don't
-        # necessarily know the details of the movie we are looking for except
-        # its title. But Movie objects are compared only on their titles (see
-        # the __eq__ method above in the Movie class).
-        # Create a new Movie object with that title, and ise that to search 
-        # search the BST.
-        self.bst.search(title)
+        # We don't necessarily know the details of the movie we are looking
+        # for except its title. But the index is keyed on titles (see
+        # __init__), so it can be searched by title directly without building
+        # any Movie or BSTNode objects.
+        if self._cache is None:
+            return self._movie(self.index.search_key(title))
+        found = self._cache.get(title)
+        if found is MISSING:
+            found = self._movie(self.index.search_key(title))
+            self._cache.put(title, found)
+        return found
+
+    def search_many(self, titles):
+        """ Return a list of the Movies with each of titles, in the same order.
+
+        The list has None for each title that isn't there. The titles are
+        sorted and looked up together in a single walk of the index, which
+        visits the nodes their paths share only once and skips the subtrees
+        none of them can be in: much less work than a search for each.
+        With a cache, only the titles that aren't cached are looked up.
+        """
+        titles = list(titles)
+        if self._cache is None:
+            return [self._movie(found) for found in self.index.search_many(titles)]
+        results = [self._cache.get(title) for title in titles]
+        missing = [titles[i] for i in range(len(titles)) if results[i] is MISSING]
+        if missing:
+            found = {}
+            for title, element in zip(missing, self.index.search_many(missing)):
+                found[title] = self._movie(element)
+                self._cache.put(title, found[title])
+            for i in range(len(titles)):
+                if results[i] is MISSING:
+                    results[i] = found[titles[i]]
+        return results
+
+    def search_all(self, title):
+        """ Return a list of every Movie with matching title, oldest first.
+
+        All the versions of a title are kept in its node, so this is a
+        single search. The list is empty if the title isn't there.
+        """
+        found = self.index.search_key(title)
+        if found is None:
+            return []
+        if self._multi:
+            return list(found)
+        return [found]
 
     def add(self, title, date, runtime):
         """ Add a new move to the library.
 
         Args:
             title - the title of the movie
-            date - the date the movie was released
-            runtime - the running time of the movie
+            date - the date the movie was released, as a day number or a
+                   dd/mm/yyyy string (which is parsed)
+            runtime - the running time of the movie, as an int or a string
+                      of digits (which is parsed)
 
         Returns:
             the movie file that was added, or None
+            (in a multi-version library, a movie is always added)
         """
         # method body goes here
         # you need to create the Movie object, then add it to the BST,
         # take what is returned from that method, and then decide what to
         # return here.
-        # Remember to handle the case where the bst is empty.
-        newMovie = Movie(title, date, runtime)
-        if self.bst is None:
-            self.bst = BSTNode(newMovie)
-            return newMovie.__str__()
-        return self.bst.add(newMovie)
+        date = MovieLib._parsed(date, parse_date)
+        runtime = MovieLib._parsed(runtime, parse_runtime)
+        return self.add_movie(Movie(title, date, runtime))
+
+    @staticmethod
+    def _parsed(value, parse):
+        """ (Private) Return value parsed with parse, if it is a string it can parse.
+
+        Other strings are kept as they are (a library with no secondary
+        indexes can hold any date), and so is anything else.
+        """
+        if isinstance(value, str):
+            try:
+                return parse(value)
+            except ValueError:
+                pass
+        return value
+
+    def add_movie(self, newMovie):
+        """ Add a Movie object to the library.
+
+        Returns the same as add. Raises ValueError, leaving the library
+        unchanged, if the library has secondary indexes and the movie's date
+        or running time is neither None nor a number.
+        """
+        # Remember to handle the case where the library is empty.
+        if self._indexes:
+            self._index_check(newMovie)
+        self._thaw()
+        if self._multi:
+            added = self._add_version(newMovie)
+        elif self.index.size() == 0:
+            self.index.add(newMovie)
+            added = newMovie.__str__()
+        else:
+            added = self.index.add(newMovie)
+        if added is not None:
+            if self._cache is not None:
+                self._cache.discard(newMovie.title)
+            if self._indexes:
+                self._index_add(newMovie)
+            if self._trie is not None:
+                self._trie_add(self._movie(self._lookup(newMovie.title)))
+            if self._ngrams is not None:
+                self._ngrams.add(newMovie.title)
+        return added
+
+    def _lookup(self, title):
+        """ (Private) Return the index element with title, or None.
+
+        For the library's own lookups. While operation stats are on, this
+        finds the element through index.items, which isn't counted, so that
+        only the searches made by callers are counted as searches.
+        """
+        if self._opstats is None:
+            return self.index.search_key(title)
+        found = next(self.index.items(title), None)
+        if found is None or self._keyfunc(found) != title:
+            return None
+        return found
+
+    def _add_version(self, movie):
+        """ (Private) Add movie to a multi-version library, and return it. """
+        versions = self._lookup(movie.title)
+        if versions is None:
+            self.index.add(Versions(movie))
+        elif hasattr(self.index, 'snapshot'):
+            # snapshots of the index share this Versions, so change a copy
+            versions = versions.copy()
+            versions.add(movie)
+            self.index.remove_key(movie.title)
+            self.index.add(versions)
+        else:
+            versions.add(movie)
+        return movie
+
+    def bulk_load(self, movies):
+        """ Replace the contents of the library with movies.
+
+        Args:
+            movies - a list of Movie objects sorted by title, with no two
+                     sharing a title (unless this is a multi-version library)
+
+        Builds the index directly, in O(n) (a perfectly balanced tree, for
+        the tree backends), then sorts the movies once for each secondary
+        index, if any.
+        """
+        elements = movies
+        if self._multi:
+            elements = []
+            for movie in movies:
+                if elements and elements[-1].title == movie.title:
+                    elements[-1].add(movie)
+                else:
+                    elements.append(Versions(movie))
+        self.index = make_index(self._backend, self._keyfunc)
+        self.index.bulk_load(elements)
+        if self._cache is not None:
+            self._cache.clear()
+        if self._opstats is not None:
+            self.index.enable_stats(self._opstats)
+        self._build_indexes(movies)
+        if self._trie is not None:
+            self._build_trie(elements)
+        if self._ngrams is not None:
+            self._build_ngrams(elements)
+
+    def _build_indexes(self, movies):
+        """ (Private) Build each secondary index from scratch from a list of movies. """
+        for name, keyfunc in MovieLib._INDEXES:
+            if name in self._indexes:
+                indexed = [movie for movie in movies if keyfunc(movie)[0] is not None]
+                indexed.sort(key=keyfunc)
+                self._indexes[name] = AVLIndex(keyfunc)
+                self._indexes[name].bulk_load(indexed)
+
+    # SNAPSHOTS
+
+    def save(self, path):
+        """ Write the library to path as a binary snapshot (see Snapshot.py).
+
+        Dates must be day numbers and runtimes ints (or None), as
+        build_library gives.
+        """
+        titles = []
+        for movie in self:
+            if titles and titles[-1][0] == movie.title:
+                titles[-1][1].append((movie.date, movie.time))
+            else:
+                titles.append((movie.title, [(movie.date, movie.time)]))
+        write_snapshot(path, titles, self._multi)
+
+    @staticmethod
+    def load(path, balanced=False, arrays=False, indexed=False, *, backend=None,
+             cache=None, autocomplete=False, fuzzy=False):
+        """ Return a library reading its movies from the snapshot at path.
+
+        The file is memory-mapped and searched in place: Movie objects are
+        only made for the movies that are looked at, so opening it is
+        quick whatever its size. The first add or remove reads the whole
+        snapshot into an ordinary index (of the kind given by balanced,
+        arrays and backend, as for MovieLib). With indexed=True the
+        secondary indexes are built straight away, which reads every movie,
+        and so are the trie with autocomplete=True and the n-gram index with
+        fuzzy=True. cache is as for MovieLib.
+        """
+        snapshot = SnapshotBST(path, MovieLib._snapshot_movie)
+        library = MovieLib(balanced=balanced, arrays=arrays, indexed=indexed,
+                           multi=snapshot.multi, backend=backend, cache=cache,
+                           autocomplete=autocomplete, fuzzy=fuzzy)
+        if snapshot.multi:
+            snapshot._factory = MovieLib._snapshot_versions
+        library._read_from(snapshot)
+        return library
+
+    def _read_from(self, index):
+        """ (Private) Start reading from a read-only index, such as a SnapshotBST.
+
+        The index is read into an ordinary one on the first change (see
+        _thaw). The secondary indexes, trie and n-gram index, if any, are
+        built from it straight away.
+        """
+        if index.size() > 0:
+            self.index = index
+        if self._indexes:
+            self._build_indexes(list(self))
+        if self._trie is not None:
+            self._build_trie(list(self.index))
+        if self._ngrams is not None:
+            self._build_ngrams(self.index)
+
+    @staticmethod
+    def _snapshot_movie(title, versions):
+        """ (Private) Return the Movie for a title read from a snapshot. """
+        return Movie(title, versions[0][0], versions[0][1])
+
+    @staticmethod
+    def _snapshot_versions(title, versions):
+        """ (Private) Return the Versions for a title read from a snapshot. """
+        element = None
+        for released, runtime in versions:
+            movie = Movie(title, released, runtime)
+            if element is None:
+                element = Versions(movie)
+            else:
+                element._movies.append(movie)  # already in date order
+        return element
+
+    @staticmethod
+    def _lazy_movie(lines):
+        """ (Private) Return the Movie for the first of a title's lines (see LazyFileBST). """
+        title, released, runtime = _parse_line(lines[0])
+        return Movie(title, released, runtime)
+
+    @staticmethod
+    def _lazy_versions(lines):
+        """ (Private) Return the Versions for all of a title's lines, in file order. """
+        element = None
+        for line in lines:
+            title, released, runtime = _parse_line(line)
+            movie = Movie(title, released, runtime)
+            if element is None:
+                element = Versions(movie)
+            else:
+                element.add(movie)
+        return element
+
+    def _thaw(self):
+        """ (Private) Swap a snapshot for an ordinary index before changing it. """
+        if isinstance(self.index, SnapshotBST):
+            index = make_index(self._backend, self._keyfunc)
+            index.bulk_load(list(self.index))
+            self.index = index
 
     def remove(self, title):
         """ Remove and return the a movie object with the given title, if there.
@@ -151,7 +651,336 @@ class MovieLib:
             title - the title of the movie to be removed
         """
         # method body goes here
-        return self.bst.remove(title)
+        self._thaw()
+        removed = self.index.remove_key(title)
+        if removed is None:
+            return None
+        if self._cache is not None:
+            self._cache.discard(title)
+        if self._indexes:
+            for movie in self._movies([removed]):
+                self._index_remove(movie)
+        if self._trie is not None:
+            self._trie.remove(title)
+        if self._ngrams is not None:
+            self._ngrams.remove(title)
+        return self._movie(removed)
+
+    # FOLLOWING A FILE
+
+    def follow(self, filename, offset=0):
+        """ Follow a movie file that grows, reading from byte offset on each refresh.
+
+        offset is where the lines not yet in the library start: 0 for the
+        whole file, or the offset build_library(follow=True) stopped at.
+        """
+        self._follow = (filename, offset)
+
+    def refresh(self):
+        """ Add the movies on the lines appended to the followed file since the last read.
+
+        Returns the number of movies added. The movies are added just as
+        build_library adds them, so a title that is already there is
+        skipped (or kept as another version, with multi=True). Only whole
+        lines are read: a last line with no line break yet waits for the
+        next refresh. Costs O(k log n) for k new lines on a balanced
+        library, as nothing before the offset is read again.
+
+        Raises ValueError if no file is being followed, or if the file is
+        now shorter than the offset (it was replaced, so rebuild instead).
+        """
+        if self._follow is None:
+            raise ValueError('this library is not following a file')
+        filename, offset = self._follow
+        movies, offset = _read_movies_from(filename, offset)
+        added = 0
+        for movie in movies:
+            if self.add_movie(movie) is not None:
+                added += 1
+        self._follow = (filename, offset)
+        return added
+
+    def snapshot(self):
+        """ Return a library holding the movies as they are now, in O(1).
+
+        Needs the 'persistent' backend: the new library shares the title
+        index's nodes, none of which are ever changed, so it can be read
+        from other threads with no locking while this one goes on being
+        changed, and neither sees the other's changes. It has just the
+        title index: no secondary indexes, cache, trie or n-gram index.
+        """
+        if not hasattr(self.index, 'snapshot'):
+            raise ValueError(type(self.index).__name__ + " indexes can't take snapshots")
+        view = MovieLib(multi=self._multi, backend=self._backend)
+        view.index = self.index.snapshot()
+        return view
+
+    # OPERATION STATS
+
+    def enable_stats(self):
+        """ Start counting the work done by each add, search and remove.
+
+        Returns the TreeStats (see BST.py) that the comparisons, nodes
+        visited and path lengths are counted in; _stats() reports them too.
+        Only the 'bst' and 'avl' backends can count, and a library loaded
+        from a snapshot is read in full first. Libraries that don't call
+        this pay nothing for it.
+        """
+        if self._opstats is not None:
+            return self._opstats
+        self._thaw()
+        if not hasattr(self.index, 'enable_stats'):
+            raise ValueError(type(self.index).__name__ + " indexes can't count their work")
+        self._opstats = self.index.enable_stats()
+        return self._opstats
+
+    def disable_stats(self):
+        """ Stop counting the work done by each operation. """
+        if self._opstats is not None:
+            self.index.disable_stats()
+            self._opstats = None
+
+    def _stats(self):
+        """ Return the stats on the library.
+
+        These are the size and height of the title index and of any
+        secondary indexes, the operation counts, if enable_stats was
+        called, and the cache's hits, misses and evictions, if it has one.
+        """
+        stats = self.index._stats()
+        for name in self._indexes:
+            stats += '\n' + name + ' index: ' + self._indexes[name]._stats()
+        if self._cache is not None:
+            stats += '\n' + self._cache._stats()
+        if self._trie is not None:
+            stats += '\nautocomplete: ' + str(len(self._trie)) + ' titles'
+        if self._ngrams is not None:
+            stats += '\nfuzzy index: ' + self._ngrams._stats()
+        return stats
+
+    # AUTOCOMPLETE
+
+    def _trie_add(self, movie):
+        """ (Private) Add or update movie's title in the trie, ranked by its date. """
+        self._trie.add(movie.title, movie, movie.date)
+
+    def _build_trie(self, elements):
+        """ (Private) Build the trie from scratch from a list of index elements. """
+        self._trie = Trie()
+        for element in elements:
+            self._trie_add(self._movie(element))
+
+    def complete(self, prefix, k=10, order='title'):
+        """ Return a list of up to k Movies whose titles start with prefix.
+
+        order is 'title' for the first k in title order, or 'newest' or
+        'oldest' for the k released last or first (movies with no date
+        come last). There is one Movie per title: the one search returns.
+        With autocomplete=True this takes O(len(prefix) + k) for title
+        order; otherwise it searches the title index, and ranking by date
+        reads every title with the prefix.
+        """
+        if order not in ('title', 'newest', 'oldest'):
+            raise ValueError("order must be 'title', 'newest' or 'oldest'")
+        if self._trie is not None:
+            if order == 'title':
+                return self._trie.complete(prefix, k)
+            return self._trie.top(prefix, k, order == 'newest')
+        movies = []
+        for element in self.index.items(prefix):
+            if not self._keyfunc(element).startswith(prefix):
+                break
+            if order == 'title' and len(movies) == k:
+                break
+            movies.append(self._movie(element))
+        if order != 'title':
+            dated = [movie for movie in movies if movie.date is not None]
+            dated.sort(key=_date_key, reverse=order == 'newest')
+            movies = (dated + [movie for movie in movies if movie.date is None])[:k]
+        return movies
+
+    # FUZZY LOOKUP
+
+    def _build_ngrams(self, elements):
+        """ (Private) Build the n-gram index from scratch from index elements. """
+        self._ngrams = NGramIndex()
+        for element in elements:
+            self._ngrams.add(self._keyfunc(element))
+
+    def search_folded(self, title):
+        """ Return a list of the Movies whose titles match title ignoring case and accents.
+
+        Punctuation and runs of spaces are ignored too (see NGram.fold).
+        There is one Movie per title, the one search returns, in title
+        order. With fuzzy=True this is a dict lookup; otherwise every
+        title is read.
+        """
+        if self._ngrams is not None:
+            return [self.search(found) for found in self._ngrams.lookup(title)]
+        key = fold(title)
+        return [self._movie(element) for element in self.index
+                if fold(self._keyfunc(element)) == key]
+
+    def search_fuzzy(self, title, k=10, threshold=0.3):
+        """ Return a list of up to k (similarity, Movie) pairs for the titles most like title.
+
+        Titles are compared by the character trigrams of their folded
+        forms (see NGram.py), and only those at least threshold similar,
+        from 0 to 1, are kept; the most similar come first, with ties in
+        title order. With fuzzy=True only the titles sharing a trigram with
+        title are scored; otherwise every title is.
+        """
+        if self._ngrams is not None:
+            return [(score, self.search(found))
+                    for score, found in self._ngrams.search(title, k, threshold)]
+        grams = ngrams(fold(title))
+        scored = []
+        for element in self.index:
+            score = similarity(grams, ngrams(fold(self._keyfunc(element))))
+            if score >= threshold:
+                scored.append((-score, self._keyfunc(element), element))
+        scored.sort(key=lambda entry: entry[:2])
+        return [(-score, self._movie(element)) for score, _, element in scored[:k]]
+
+    # SECONDARY INDEXES
+
+    def _index_check(self, movie):
+        """ (Private) Raise ValueError if movie can't go in each secondary index. """
+        for name, keyfunc in MovieLib._INDEXES:
+            value = keyfunc(movie)[0]
+            if name in self._indexes and value is not None and not isinstance(value, int):
+                raise ValueError('the ' + name + ' index needs a number, not ' + repr(value))
+
+    def _index_add(self, movie):
+        """ (Private) Add movie to each secondary index it has a value for. """
+        for name, keyfunc in MovieLib._INDEXES:
+            if name in self._indexes and keyfunc(movie)[0] is not None:
+                self._indexes[name].add(movie)
+
+    def _index_remove(self, movie):
+        """ (Private) Remove movie from each secondary index it is in.
+
+        Every movie in an index with the same value and title goes too, as
+        a library only removes all the versions of a title at once. The
+        entries are found by value and title, not by the movie itself,
+        since a library read from a snapshot makes new Movies for the
+        same movies.
+        """
+        for name, keyfunc in MovieLib._INDEXES:
+            value = keyfunc(movie)[0]
+            if name not in self._indexes or value is None:
+                continue
+            index = self._indexes[name]
+            while True:
+                found = next(index.items((value, movie.title)), None)
+                if found is None or keyfunc(found)[:2] != (value, movie.title):
+                    break
+                index.remove_key(keyfunc(found))
+
+    def _index_range(self, name, lo, hi):
+        """ (Private) Return (count, movies) for lo <= value < hi in an index.
+
+        movies is a generator, in index order; count is found from the
+        ranks of the two bounds, without visiting the movies.
+        """
+        index = self._indexes[name]
+        lokey = None
+        hikey = None
+        # (value,) sorts before (value, title) for every title
+        if lo is not None:
+            lokey = (lo,)
+        if hi is not None:
+            hikey = (hi,)
+        count = index.size()
+        if hikey is not None:
+            count = index.rank(hikey)
+        if lokey is not None:
+            count -= index.rank(lokey)
+        return max(count, 0), index.items(lokey, hikey)
+
+    @staticmethod
+    def _in(value, bounds):
+        """ (Private) Return True if value is in the (lo, hi) pair bounds. """
+        if bounds is None:
+            return True
+        lo, hi = bounds
+        if value is None:
+            return False
+        return (lo is None or lo <= value) and (hi is None or value < hi)
+
+    @staticmethod
+    def _day(day):
+        """ (Private) Return day as a day number, parsing dd/mm/yyyy strings. """
+        if isinstance(day, str):
+            return parse_date(day)
+        return day
+
+    def released_between(self, lo=None, hi=None):
+        """ Yield the movies released from lo (inclusive) to hi (exclusive).
+
+        Args:
+            lo, hi - day numbers or dd/mm/yyyy strings; None for no bound
+
+        Movies come out in date order. Uses the date index if there is one,
+        and otherwise looks at every movie.
+        """
+        lo, hi = MovieLib._day(lo), MovieLib._day(hi)
+        if 'date' in self._indexes:
+            return self._index_range('date', lo, hi)[1]
+        return self._scan(lambda movie: MovieLib._in(movie.date, (lo, hi)), _date_key)
+
+    def runtime_between(self, lo=None, hi=None):
+        """ Yield the movies running from lo (inclusive) to hi (exclusive) minutes.
+
+        Movies come out shortest first. Uses the running time index if
+        there is one, and otherwise looks at every movie.
+        """
+        if 'time' in self._indexes:
+            return self._index_range('time', lo, hi)[1]
+        return self._scan(lambda movie: MovieLib._in(movie.time, (lo, hi)), _time_key)
+
+    def _scan(self, test, keyfunc):
+        """ (Private) Return a generator of the movies passing test, sorted by keyfunc. """
+        return iter(sorted([movie for movie in self if test(movie)], key=keyfunc))
+
+    def query(self, released=None, runtime=None):
+        """ Return a list of the movies matching all of the given conditions.
+
+        Args:
+            released - a (lo, hi) pair of dates, as for released_between,
+                       or None for any date
+            runtime - a (lo, hi) pair of minutes, as for runtime_between,
+                      or None for any running time
+
+        The movies are returned in title order. With indexes, the number of
+        movies in each range is counted in O(log n), only the smaller range
+        is walked, and each movie in it is checked against the other
+        condition. So "released 1970-1979 and longer than 120 minutes" is
+        query(released=('01/01/1970', '01/01/1980'), runtime=(121, None)).
+        """
+        if released is not None:
+            released = (MovieLib._day(released[0]), MovieLib._day(released[1]))
+        conditions = []
+        if released is not None:
+            conditions.append(('date', released))
+        if runtime is not None:
+            conditions.append(('time', runtime))
+        if not conditions:
+            return list(self)
+
+        candidates = None
+        if self._indexes:
+            best = None
+            for name, bounds in conditions:
+                count, movies = self._index_range(name, bounds[0], bounds[1])
+                if best is None or count < best:
+                    best, candidates = count, movies
+        if candidates is None:
+            candidates = iter(self)
+        matches = [movie for movie in candidates
+                   if MovieLib._in(movie.date, released) and MovieLib._in(movie.time, runtime)]
+        matches.sort(key=Movie.get_title)
+        return matches
 
     @staticmethod
     def _testadd():
@@ -244,37 +1073,286 @@ class MovieLib:
         library.remove("G")
         print('Library:', library)
 
+        # versions of a title sharing a date or running time are all indexed
+        library = MovieLib(indexed=True, multi=True)
+        for title, released, runtime in (("Heat", 10, 90), ("Heat", 20, 90), ("Heat", 20, 90),
+                                         ("Alien", 20, 117)):
+            library.add(title, released, runtime)
+        print('running 90 minutes should be 3 and is',
+              len(list(library.runtime_between(90, 91))))
+        print('released on day 20 should be 3 and is',
+              len(list(library.released_between(20, 21))))
+        library.remove("Heat")
+        print('after removing Heat, should be 0 and 1:',
+              len(list(library.runtime_between(90, 91))),
+              len(list(library.released_between(20, 21))))
 
-def build_library(filename):
-    """ Return a library of Movie files built from filename """
+        # a dd/mm/yyyy date given to add is parsed, so it can be indexed
+        library = MovieLib(indexed=True)
+        library.add("Memento", "11/10/2000", "113")
+        print('released in 2000 should be [Memento] and is',
+              list(library.released_between("01/01/2000", "01/01/2001")))
+        try:
+            library.add("Heat", "b", 1)
+        except ValueError as error:
+            print('a date that is not a date is refused:', error)
+        print('size should be 1 and is', library.size(), '- date index:',
+              library._indexes['date'].size())
 
-    # open the file
-    file = open(filename, 'r', encoding="utf8")
+        # following a file builds the same library as reading it
+        plain = [movie.full_str() for movie in build_library('smallmovies.txt')]
+        followed = [movie.full_str() for movie in build_library('smallmovies.txt', follow=True)]
+        print('following builds the same library:', plain == followed)
+
+    @staticmethod
+    def _testbalanced(filename='movies.txt'):
+        """ Check the AVL height bound on filename, in file and title order. """
+        library = build_library(filename, balanced=True)
+        n = library.size()
+        bound = 1.44 * math.log2(n + 2) - 0.328
+        print('height should be at most', round(bound, 2), 'and is', library.index.height())
+        print('proper AVL tree:', library.index._properBST())
+
+        # the same movies again, added in title order
+        movies = []
+        file = open(filename, 'r', encoding="utf8")
+        for line in file:
+            movies.append(line.split('\t'))
+        file.close()
+        movies.sort()
+        library = MovieLib(balanced=True)
+        for movie in movies:
+            library.add(movie[0], movie[1], movie[2])
+        print('title order: height should be at most', round(bound, 2), 'and is', library.index.height())
+        print('proper AVL tree:', library.index._properBST())
+
+
+def build_library(filename, balanced=False, bulk=False, arrays=False, indexed=False,
+                  multi=False, processes=None, lazy=False, *, backend=None, cache=None,
+                  autocomplete=False, fuzzy=False, follow=False):
+    """ Return a library of Movie files built from filename
+
+    With balanced=True the library is kept as an AVL tree, and with
+    arrays=True as an ArrayBST; backend names any other kind of index
+    (see MovieLib). With indexed=True it also keeps the release
+    date and running time indexes, with multi=True it keeps every
+    version of each title, with cache=n it caches the results of
+    searches for n titles, with autocomplete=True it keeps a trie of
+    the titles for MovieLib.complete, and with fuzzy=True an n-gram index
+    of them for search_folded and search_fuzzy (see MovieLib).
+    With bulk=True the file is read in full, the first movie with each title
+    is kept, and the library is built in one go from the movies sorted by
+    title (see MovieLib.bulk_load) instead of adding them one at a time.
+    With processes=n the file is split into n chunks that are parsed in
+    parallel by a pool of n processes (see _read_movies_parallel); the
+    movies are still added in file order. Scripts using this must guard
+    their top level with if __name__ == '__main__'.
+    With lazy=True the file is memory-mapped and the library searches it
+    in place (see LazyFileBST): only the offsets of the lines are kept,
+    sorted by title, and a Movie is made from its line each time it is
+    looked at. The first change reads every movie into an ordinary
+    index, as for a library loaded from a snapshot (see MovieLib.load).
+    bulk has no effect then, as the lines are sorted in one go anyway.
+    With follow=True the library remembers how far into the file it has
+    read, and MovieLib.refresh adds the lines appended since (see
+    MovieLib.follow). The library is the same as without follow: the
+    whole file is read, a last line with no line break included. This
+    reads the file in one go, so it can't be used with lazy or processes.
+    """
+    # read the file
+    if follow:
+        if lazy or (processes is not None and processes > 1):
+            raise ValueError("follow can't be used with lazy or processes")
+        movies, offset = _read_movies_from(filename, 0, last=True)
+    elif lazy:
+        return _lazy_build_library(filename, balanced=balanced, arrays=arrays,
+                                   indexed=indexed, multi=multi, backend=backend,
+                                   cache=cache, autocomplete=autocomplete, fuzzy=fuzzy)
+    elif processes is not None and processes > 1:
+        movies = _read_movies_parallel(filename, processes)
+    else:
+        movies = _read_movies(filename)
+
+    if bulk:
+        library = _bulk_build_library(movies, balanced=balanced, arrays=arrays,
+                                      indexed=indexed, multi=multi, backend=backend,
+                                      cache=cache, autocomplete=autocomplete, fuzzy=fuzzy)
+        if follow:
+            library.follow(filename, offset)
+        return library
 
     # create the library
-    library = MovieLib()
+    library = MovieLib(balanced=balanced, arrays=arrays, indexed=indexed, multi=multi,
+                       backend=backend, cache=cache, autocomplete=autocomplete, fuzzy=fuzzy)
+    if follow:
+        library.follow(filename, offset)
 
     filecount = 0
     count = 0
 
-    # now cycle through the  lines in the file, adding the movies to the
-    # library
-    for line in file:
+    # now cycle through the movies in the file, adding them to the library
+    for movie in movies:
         filecount += 1
-        inputlist = line.split('\t')
-        added = library.add(inputlist[0], inputlist[1], inputlist[2])
+        added = library.add_movie(movie)
         if added is not None:
             count += 1
 
     # print out some info for sanity checking
     print("read a file with", filecount, "movies")
+    if multi:
+        count = library.size()
     print("Built a library with", count, "unique movie titles")
     return library
 
 
+def _bulk_build_library(allmovies, balanced=False, arrays=False, indexed=False, multi=False,
+                        *, backend=None, cache=None, autocomplete=False, fuzzy=False):
+    """ Return a library built from a sequence of movies with MovieLib.bulk_load. """
+    library = MovieLib(balanced=balanced, arrays=arrays, indexed=indexed, multi=multi,
+                       backend=backend, cache=cache, autocomplete=autocomplete, fuzzy=fuzzy)
+
+    filecount = 0
+    movies = {}
+    for movie in allmovies:
+        filecount += 1
+        if movie.title not in movies:
+            movies[movie.title] = [movie]
+        elif multi:
+            movies[movie.title].append(movie)
+        # otherwise first occurrence wins, just as with MovieLib.add
+
+    library.bulk_load([movie for title in sorted(movies) for movie in movies[title]])
+
+    # print out some info for sanity checking
+    print("read a file with", filecount, "movies")
+    print("Built a library with", len(movies), "unique movie titles")
+    return library
+
+
+def _lazy_build_library(filename, balanced=False, arrays=False, indexed=False, multi=False,
+                        *, backend=None, cache=None, autocomplete=False, fuzzy=False):
+    """ Return a library searching filename in place with a LazyFileBST. """
+    library = MovieLib(balanced=balanced, arrays=arrays, indexed=indexed, multi=multi,
+                       backend=backend, cache=cache, autocomplete=autocomplete, fuzzy=fuzzy)
+    factory = MovieLib._lazy_movie
+    if multi:
+        factory = MovieLib._lazy_versions
+    index = LazyFileBST(filename, factory, multi)
+    library._read_from(index)
+
+    # print out some info for sanity checking
+    print("read a file with", index.lines, "movies")
+    print("Built a library with", index.size(), "unique movie titles")
+    return library
+
+
+def _parse_line(line):
+    """ Return (title, date, runtime) from one tab-separated line of a movie file. """
+    inputlist = line.split('\t')
+    return inputlist[0], parse_date(inputlist[1]), parse_runtime(inputlist[2])
+
+
+def _read_movies(filename):
+    """ Yield a Movie for each line of filename, in order. """
+    file = open(filename, 'r', encoding="utf8")
+    for line in file:
+        title, released, runtime = _parse_line(line)
+        yield Movie(title, released, runtime)
+    file.close()
+
+
+def _read_movies_from(filename, offset, last=False):
+    """ Return a list of Movies for the whole lines of filename after byte offset.
+
+    Also returns the offset just after the last line read, where the next
+    read should start. A last line with no line break yet is left for a
+    later read, unless last=True, when it is read too (the file is taken
+    to be complete, as when a library is first built). Blank lines are
+    skipped. Raises ValueError if the file is shorter than offset.
+    """
+    file = open(filename, 'rb')
+    size = os.fstat(file.fileno()).st_size
+    if size < offset:
+        file.close()
+        raise ValueError(filename + ' is shorter than when it was last read')
+    file.seek(offset)
+    data = file.read(size - offset)
+    file.close()
+    end = len(data)
+    if not last:
+        end = data.rfind(b'\n') + 1  # a line with no line break yet is left for later
+    lines = io.TextIOWrapper(io.BytesIO(data[:end]), encoding="utf8")
+    movies = []
+    for line in lines:
+        if not line.strip():
+            continue
+        title, released, runtime = _parse_line(line)
+        movies.append(Movie(title, released, runtime))
+    return movies, offset + end
+
+
+def _read_movies_parallel(filename, processes):
+    """ Return a list of Movies for the lines of filename, in order.
+
+    The file is cut into about equal byte ranges, each moved on to just
+    after a line break, and each range is parsed by its own worker process.
+    The chunks' results come back in file order, as columns of titles,
+    dates and running times, which cost the parent less to unpickle than
+    a tuple per line; the parent only has to make the Movies.
+
+    Parsing is about two thirds of the work of reading a file, so this
+    only pays when there are that many cores free and the file is large
+    enough to cover starting the pool: on one core it is slower than
+    reading the file directly.
+    """
+    filesize = os.path.getsize(filename)
+    bounds = [0]
+    file = open(filename, 'rb')
+    for i in range(1, processes):
+        start = max(filesize * i // processes, bounds[-1])
+        file.seek(start)
+        if start > 0:
+            file.readline()  # finish the line we landed in
+        bounds.append(min(file.tell(), filesize))
+    file.close()
+    bounds.append(filesize)
+
+    movies = []
+    with ProcessPoolExecutor(processes) as pool:
+        chunks = pool.map(_parse_chunk, [filename] * processes, bounds[:-1], bounds[1:])
+        for titles, dates, runtimes in chunks:
+            movies.extend(map(Movie, titles, dates, runtimes))
+    return movies
+
+
+def _parse_chunk(filename, start, end):
+    """ Return (titles, dates, runtimes) lists for the lines in bytes start:end of filename.
+
+    Runs in a worker process. The bytes are read back as text just as
+    open() would, so line endings are handled the same way.
+    """
+    titles = []
+    dates = []
+    runtimes = []
+    if start >= end:
+        return titles, dates, runtimes
+    file = open(filename, 'rb')
+    file.seek(start)
+    data = file.read(end - start)
+    file.close()
+    for line in io.TextIOWrapper(io.BytesIO(data), encoding="utf8"):
+        title, released, runtime = _parse_line(line)
+        titles.append(title)
+        dates.append(released)
+        runtimes.append(runtime)
+    return titles, dates, runtimes
+
+
 # MovieLib._testadd()
 # print('++++++++++')
 # MovieLib._test()
+# print('++++++++++')
+# MovieLib._testbalanced()
 
 # newlibrary = build_library('smallmovies.txt')
 # print(newlibrary)
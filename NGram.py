@@ -0,0 +1,167 @@
+""" Class definition for a character n-gram index of strings, for fuzzy lookup.
+
+Each string is folded (see fold) and cut into its overlapping n-grams, and
+the index maps each n-gram to the strings that have it. A query is cut up
+the same way, and only the strings sharing an n-gram with it are looked
+at: they are scored by the n-grams the two have in common (see
+similarity), so a typo, a missing word or just the start of a long title
+still finds the string it was meant to be.
+"""
+
+import heapq
+import unicodedata
+
+DEFAULT_N = 3
+
+
+def fold(text):
+    """ Return text with case, accents and punctuation folded away.
+
+    Letters are casefolded and stripped of their diacritics, anything that
+    is not a letter or digit becomes a space, and runs of spaces are
+    collapsed, so 'Amélie', 'AMELIE' and 'amelie!' all fold to 'amelie'.
+    """
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    kept = ''
+    for char in decomposed:
+        if unicodedata.combining(char):
+            continue
+        if char.isalnum():
+            kept += char
+        else:
+            kept += ' '
+    return ' '.join(kept.split())
+
+
+def ngrams(key, n=DEFAULT_N):
+    """ Return the set of n-grams of a folded key.
+
+    The key is padded with spaces, so short keys and the starts and ends
+    of words have n-grams of their own.
+    """
+    padded = ' ' * (n - 1) + key + ' '
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def similarity(grams, other):
+    """ Return how similar a query's set of n-grams is to another's, from 0 to 1.
+
+    This is the mean of two shares of the n-grams they have in common: of
+    the query's n-grams (so a query that is part of a much longer string
+    still scores at least a half), and of all the n-grams of both (their
+    Jaccard similarity, so of the strings containing the query, the
+    closest in length scores highest, and only an exact match scores 1).
+    """
+    return _score(len(grams & other), len(grams), len(other))
+
+
+def _score(shared, size, othersize):
+    """ (Private) Return the similarity from the sizes of two sets and of their overlap. """
+    if shared == 0:
+        return 0.0
+    return (shared / size + shared / (size + othersize - shared)) / 2
+
+
+class NGramIndex:
+    """ An inverted index from n-grams to the strings that have them.
+
+    Strings are grouped by their folded key, so an exact lookup ignoring
+    case and accents is a single dict lookup.
+    """
+
+    def __init__(self, n=DEFAULT_N):
+        """ Initialise an empty index of n-grams of length n. """
+        if n < 1:
+            raise ValueError('an n-gram index needs n of at least 1')
+        self.n = n
+        self._postings = {}  # n-gram -> set of folded keys
+        self._strings = {}  # folded key -> set of the strings that fold to it
+        self._grams = {}  # folded key -> its set of n-grams
+
+    def __len__(self):
+        """ Return the number of strings. """
+        return sum(len(strings) for strings in self._strings.values())
+
+    def __contains__(self, text):
+        """ Return True if text is in the index. """
+        return text in self._strings.get(fold(text), ())
+
+    def add(self, text):
+        """ Add text, if it isn't there already. """
+        key = fold(text)
+        strings = self._strings.get(key)
+        if strings is None:
+            strings = self._strings[key] = set()
+            grams = self._grams[key] = ngrams(key, self.n)
+            for gram in grams:
+                postings = self._postings.get(gram)
+                if postings is None:
+                    postings = self._postings[gram] = set()
+                postings.add(key)
+        strings.add(text)
+
+    def remove(self, text):
+        """ Remove text, if it is there. """
+        key = fold(text)
+        strings = self._strings.get(key)
+        if strings is None or text not in strings:
+            return
+        strings.remove(text)
+        if strings:
+            return
+        del self._strings[key]
+        for gram in self._grams.pop(key):
+            postings = self._postings[gram]
+            postings.remove(key)
+            if not postings:
+                del self._postings[gram]
+
+    def lookup(self, text):
+        """ Return a sorted list of the strings that fold to the same key as text. """
+        return sorted(self._strings.get(fold(text), ()))
+
+    def search(self, text, k=10, threshold=0.3):
+        """ Return a list of up to k (similarity, string) pairs, most similar first.
+
+        Only strings at least threshold similar to text are returned (see
+        similarity), with ties in string order. Only the strings sharing an
+        n-gram with text are scored, so the time taken depends on how many
+        of those there are, not on the size of the index.
+        """
+        grams = ngrams(fold(text), self.n)
+        shared = {}
+        for gram in grams:
+            for key in self._postings.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+        scored = []
+        for key, count in shared.items():
+            score = _score(count, len(grams), len(self._grams[key]))
+            if score >= threshold:
+                for string in self._strings[key]:
+                    scored.append((-score, string))
+        return [(-score, string) for score, string in heapq.nsmallest(k, scored)]
+
+    def _stats(self):
+        """ Return the size of the index. """
+        return str(len(self)) + ' strings, ' + str(len(self._strings)) + ' keys, ' \
+            + str(len(self._postings)) + ' ' + str(self.n) + '-grams'
+
+    @staticmethod
+    def _test():
+        index = NGramIndex()
+        for title in ('Amélie', 'Won Ton Ton, the Dog Who Saved Hollywood', 'Alien', 'Aliens',
+                      'ALIEN', 'The Godfather', 'Godfather', 'Dogville'):
+            index.add(title)
+        print('fold Amélie:', fold('Amélie'))
+        print('lookup amelie:', index.lookup('amelie'))
+        print('lookup alien:', index.lookup('alien'))
+        print('search won ton ton the dog:', index.search('won ton ton the dog'))
+        print('search won ton ton:', index.search('won ton ton'))
+        print('search godfater:', index.search('godfater'))
+        print('search aliens!:', index.search('aliens!'))
+        index.remove('ALIEN')
+        print('after removing ALIEN, lookup alien:', index.lookup('alien'))
+        print(index._stats())
+
+
+# NGramIndex._test()
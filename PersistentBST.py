@@ -0,0 +1,332 @@
+""" Class definition for a persistent (path-copying) BST index.
+
+The nodes of a PersistentBST are never changed once made. An add or
+remove copies just the nodes on the path from the root down to where the
+change is, and shares every other subtree with the tree it started from;
+the new root is then swapped in with a single assignment. So a reader
+that took the root before a change still has the whole tree as it was,
+without any locking, and the nodes only it could reach are reclaimed by
+the garbage collector once it lets go. snapshot() hands out such a root.
+
+The tree is not self-balancing (like BSTNode), but bulk_load builds a
+perfectly balanced one. Changes must still come from one writer at a time.
+"""
+
+
+class PNode:
+    """ An immutable node of a PersistentBST, counting its subtree's nodes. """
+
+    __slots__ = ('element', 'key', 'left', 'right', 'size')
+
+    def __init__(self, element, key, left=None, right=None):
+        """ Initialise a node holding element under key, with two subtrees. """
+        self.element = element
+        self.key = key
+        self.left = left
+        self.right = right
+        self.size = 1 + PNode._s(left) + PNode._s(right)
+
+    @staticmethod
+    def _s(node):
+        """ (Private) Return the size of the subtree at node, or 0 for None. """
+        if node is None:
+            return 0
+        return node.size
+
+
+class PersistentBST:
+    """ An ordered index kept in a persistent BST of PNodes.
+
+    Has the methods of every index (see Backends.py), and snapshot().
+    Each read works on the root as it was when the read started.
+    """
+
+    def __init__(self, key, root=None):
+        """ Initialise an index whose items have keys key(item), holding the tree at root. """
+        self._keyfunc = key
+        self.root = root
+
+    def __str__(self):
+        """ Return an in-order string of the tree, as for BSTNode. """
+        traversal = []
+        stack = []
+        if self.root is not None:
+            stack.append(self.root)
+        while stack:
+            item = stack.pop()
+            if not isinstance(item, PNode):
+                traversal.append(item)
+                continue
+            if item.right is not None:
+                stack.append(')')
+                stack.append(item.right)
+            stack.append('(' + str(item.element) + ')')
+            if item.left is not None:
+                stack.append(item.left)
+                stack.append('(')
+        return ''.join(traversal)
+
+    __repr__ = __str__
+
+    def __iter__(self):
+        """ Yield every item in key order. """
+        return self.items()
+
+    def snapshot(self):
+        """ Return a PersistentBST holding the tree as it is now, in O(1).
+
+        The two share all their nodes, but a change to either is not seen
+        by the other.
+        """
+        return PersistentBST(self._keyfunc, self.root)
+
+    # SEARCHING
+
+    @staticmethod
+    def _find(root, key):
+        """ (Private) Return the node under root whose key is key, or None. """
+        candidate = None
+        current = root
+        while current is not None:
+            if key < current.key:
+                current = current.left
+            else:
+                candidate = current
+                current = current.right
+        if candidate is not None and candidate.key == key:
+            return candidate
+        return None
+
+    def search_key(self, key):
+        """ Return the item with key, or None. """
+        node = PersistentBST._find(self.root, key)
+        if node is None:
+            return None
+        return node.element
+
+    def search_many(self, keys):
+        """ Return a list of the items with keys, with None where missing.
+
+        Every key is looked up in the same version of the tree.
+        """
+        root = self.root
+        results = []
+        for key in keys:
+            node = PersistentBST._find(root, key)
+            if node is None:
+                results.append(None)
+            else:
+                results.append(node.element)
+        return results
+
+    def items(self, lo=None, hi=None):
+        """ Yield the items with lo <= key < hi, in key order.
+
+        The items come from the tree as it was when this was called, even
+        if it is changed while they are being taken.
+        """
+        stack = []
+        current = self.root
+        while current is not None:
+            if lo is None or not current.key < lo:
+                stack.append(current)
+                current = current.left
+            else:
+                current = current.right
+        while stack:
+            node = stack.pop()
+            if hi is not None and not node.key < hi:
+                return
+            yield node.element
+            current = node.right
+            while current is not None:
+                stack.append(current)
+                current = current.left
+
+    def size(self):
+        """ Return the number of items. """
+        return PNode._s(self.root)
+
+    def rank(self, key):
+        """ Return the number of items with keys before key. """
+        rank = 0
+        current = self.root
+        while current is not None:
+            if current.key < key:
+                rank += 1 + PNode._s(current.left)
+                current = current.right
+            else:
+                current = current.left
+        return rank
+
+    def select(self, k):
+        """ Return the item at zero-based position k in key order, or None. """
+        current = self.root
+        if k < 0 or k >= PNode._s(current):
+            return None
+        while True:
+            leftsize = PNode._s(current.left)
+            if k < leftsize:
+                current = current.left
+            elif k == leftsize:
+                return current.element
+            else:
+                k -= leftsize + 1
+                current = current.right
+
+    def height(self):
+        """ Return the height of the tree (-1 when empty). """
+        height = -1
+        level = []
+        if self.root is not None:
+            level.append(self.root)
+        while level:
+            height += 1
+            below = []
+            for node in level:
+                if node.left is not None:
+                    below.append(node.left)
+                if node.right is not None:
+                    below.append(node.right)
+            level = below
+        return height
+
+    # CHANGING THE TREE
+
+    @staticmethod
+    def _copypath(path, node):
+        """ (Private) Return the root of a copy of path with node in place of its end.
+
+        path is a list of (node, went left) pairs from the root down; each
+        is copied with its child on the path replaced by the copy below it.
+        """
+        for parent, left in reversed(path):
+            if left:
+                node = PNode(parent.element, parent.key, node, parent.right)
+            else:
+                node = PNode(parent.element, parent.key, parent.left, node)
+        return node
+
+    def add(self, item):
+        """ Add item; return it, or None if its key was already there. """
+        key = self._keyfunc(item)
+        path = []
+        current = self.root
+        while current is not None:
+            if key == current.key:
+                return None
+            left = key < current.key
+            path.append((current, left))
+            if left:
+                current = current.left
+            else:
+                current = current.right
+        self.root = PersistentBST._copypath(path, PNode(item, key))
+        return item
+
+    def remove_key(self, key):
+        """ Remove and return the item with key, or None.
+
+        The node is replaced by a copy of its predecessor if it has two
+        children; no node is changed in place.
+        """
+        path = []
+        current = self.root
+        while current is not None and current.key != key:
+            left = key < current.key
+            path.append((current, left))
+            if left:
+                current = current.left
+            else:
+                current = current.right
+        if current is None:
+            return None
+        if current.left is None:
+            replacement = current.right
+        elif current.right is None:
+            replacement = current.left
+        else:
+            # copy the path down to the largest node on the left, leaving it out
+            leftpath = []
+            largest = current.left
+            while largest.right is not None:
+                leftpath.append((largest, False))
+                largest = largest.right
+            left = PersistentBST._copypath(leftpath, largest.left)
+            replacement = PNode(largest.element, largest.key, left, current.right)
+        self.root = PersistentBST._copypath(path, replacement)
+        return current.element
+
+    def bulk_load(self, items):
+        """ Replace the contents with items, sorted by key with no repeats.
+
+        Builds a perfectly balanced tree in O(n), as BSTNode.from_sorted does.
+        """
+        keys = [self._keyfunc(item) for item in items]
+        built = {}  # (lo, hi) -> the root of the subtree for items[lo:hi]
+        # each task is (lo, hi, children built yet); a subtree is made
+        # after its children, since its nodes can't be changed later
+        tasks = [(0, len(items), False)]
+        while tasks:
+            lo, hi, ready = tasks.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if ready:
+                built[(lo, hi)] = PNode(items[mid], keys[mid], built.pop((lo, mid), None),
+                                        built.pop((mid + 1, hi), None))
+            else:
+                tasks.append((lo, hi, True))
+                tasks.append((lo, mid, False))
+                tasks.append((mid + 1, hi, False))
+        self.root = built.get((0, len(items)))
+
+    # MISC CODE
+
+    def _stats(self):
+        """ Return the size and height, as a string. """
+        return 'size = ' + str(self.size()) + '; height = ' + str(self.height())
+
+    def _properBST(self):
+        """ Return True if the keys are in order and every subtree size is right. """
+        previous = None
+        first = True
+        for node in self._nodes():
+            if not first and not previous < node.key:
+                return False
+            if node.size != 1 + PNode._s(node.left) + PNode._s(node.right):
+                return False
+            previous = node.key
+            first = False
+        return True
+
+    def _nodes(self):
+        """ (Private) Yield the nodes in key order. """
+        stack = []
+        current = self.root
+        while stack or current is not None:
+            while current is not None:
+                stack.append(current)
+                current = current.left
+            node = stack.pop()
+            yield node
+            current = node.right
+
+    @staticmethod
+    def _test():
+        tree = PersistentBST(str)
+        for item in ['M', 'F', 'T', 'C', 'H', 'P', 'W', 'A']:
+            tree.add(item)
+        print('Tree:', tree)
+        before = tree.snapshot()
+        print('removing F ->', tree.remove_key('F'))
+        print('adding G ->', tree.add('G'))
+        print('Tree:', tree, '- proper BST:', tree._properBST())
+        print('Snapshot taken before the changes is unchanged:', before)
+        print('shared right subtree:', tree.root.right is before.root.right)
+        print('rank of P:', tree.rank('P'), '- select 2:', tree.select(2), '- height:', tree.height())
+        tree.bulk_load(['a', 'b', 'c', 'd', 'e', 'f', 'g'])
+        print('bulk loaded:', tree, tree._stats())
+
+
+# PersistentBST._test()
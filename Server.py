@@ -0,0 +1,333 @@
+""" An asyncio TCP server answering queries on a MovieLib, with a client and a load test.
+
+The library is built once, when the server starts. Each request is one
+line of tab-separated fields, in UTF-8:
+
+    SEARCH<tab>title       the movie with that title
+    RANGE<tab>lo<tab>hi    the movies with titles from lo up to hi (either
+                           can be empty, for no bound)
+    PREFIX<tab>prefix      the movies whose titles start with prefix
+    SIZE                   the number of movies
+
+and the answer is a line 'OK', a line per movie (its full_str) or value,
+then a line holding just '.'. A bad request (or one that isn't UTF-8),
+or a search that fails, gets a line 'ERROR' and the reason, then '.'.
+A connection's requests are answered in order.
+
+Searches are coalesced: every SEARCH that arrives while the event loop is
+busy is put in one batch, and the batch is answered with one call to
+MovieLib.search_many, so many clients searching at once share one walk
+of the index. Long answers are streamed, written out a few lines at a
+time as the library is walked. The server only reads the library, from
+the event loop's own thread, so it needs no locks.
+
+Run from this directory:
+
+    python Server.py movies.txt --port 8765     # serve until stopped
+    python Server.py movies.txt --load          # load test on localhost
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from MovieLibrary import build_library
+
+DEFAULT_PORT = 8765
+MAX_BATCH = 256  # searches answered by one search_many, at most
+STREAM_CHUNK = 100  # lines written between waits for the client to catch up
+
+
+class SearchBatcher:
+    """ Gathers searches into batches for MovieLib.search_many.
+
+    A batch is sent once the searches that came in with it have all been
+    read (on the next turn of the event loop, or after delay seconds if
+    that is more than 0), or once it holds max_batch titles. Asking for
+    the same title twice in a batch searches for it once.
+    """
+
+    def __init__(self, library, max_batch=MAX_BATCH, delay=0):
+        """ Initialise a batcher for library. max_batch=1 turns batching off. """
+        if max_batch < 1:
+            raise ValueError('a batch must hold at least one search')
+        self.library = library
+        self.max_batch = max_batch
+        self.delay = delay
+        self._pending = {}  # title -> futures waiting for it
+        self._timer = None
+        self.batches = 0
+        self.searches = 0
+
+    def search(self, title):
+        """ Return a future for the Movie with title (or None). """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiting = self._pending.get(title)
+        if waiting is None:
+            waiting = self._pending[title] = []
+        waiting.append(future)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            if self.delay > 0:
+                self._timer = loop.call_later(self.delay, self._flush)
+            else:
+                self._timer = loop.call_soon(self._flush)
+        return future
+
+    def _flush(self):
+        """ (Private) Search for every pending title at once, and answer their futures. """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = {}
+        titles = list(pending)
+        try:
+            if len(titles) == 1:
+                found = [self.library.search(titles[0])]
+            else:
+                found = self.library.search_many(titles)
+        except Exception as error:
+            # fail every search in the batch, rather than leave them waiting
+            for waiting in pending.values():
+                for future in waiting:
+                    if not future.done():
+                        future.set_exception(error)
+            return
+        self.batches += 1
+        for title, movie in zip(titles, found):
+            for future in pending[title]:
+                self.searches += 1
+                if not future.done():
+                    future.set_result(movie)
+
+    def _stats(self):
+        """ Return the number of searches and batches, as a string. """
+        outstr = str(self.searches) + ' searches in ' + str(self.batches) + ' batches'
+        if self.batches > 0:
+            outstr += ' (' + str(round(self.searches / self.batches, 1)) + ' per batch)'
+        return outstr
+
+
+class MovieServer:
+    """ Serves queries on a MovieLib over TCP (see the module docstring). """
+
+    def __init__(self, library, max_batch=MAX_BATCH, delay=0):
+        """ Initialise a server for library, batching searches as SearchBatcher does. """
+        self.library = library
+        self.batcher = SearchBatcher(library, max_batch, delay)
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """ Start listening on host and port (0 for any free port); return the port. """
+        self.server = await asyncio.start_server(self._serve, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """ Stop listening, and wait for the server to close. """
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        """ (Private) Answer the requests on one connection until it closes. """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    text = line.decode('utf8')
+                except UnicodeDecodeError:
+                    writer.write(b'ERROR bad request: not UTF-8\n.\n')
+                    await writer.drain()
+                    continue
+                await self._answer(text.rstrip('\r\n').split('\t'), writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, fields, writer):
+        """ (Private) Write the answer to one request, ending with '.'. """
+        command = fields[0].upper()
+        if command == 'SEARCH' and len(fields) == 2:
+            try:
+                movie = await self.batcher.search(fields[1])
+            except Exception as error:
+                writer.write(('ERROR search failed: ' + repr(error) + '\n').encode('utf8'))
+            else:
+                writer.write(b'OK\n')
+                if movie is not None:
+                    writer.write((movie.full_str() + '\n').encode('utf8'))
+        elif command == 'RANGE' and len(fields) == 3:
+            writer.write(b'OK\n')
+            await self._stream(self.library.range(fields[1] or None, fields[2] or None), writer)
+        elif command == 'PREFIX' and len(fields) == 2:
+            writer.write(b'OK\n')
+            await self._stream(self.library.prefix(fields[1]), writer)
+        elif command == 'SIZE' and len(fields) == 1:
+            writer.write(('OK\n' + str(self.library.size()) + '\n').encode('utf8'))
+        else:
+            writer.write(('ERROR bad request: ' + '\t'.join(fields) + '\n').encode('utf8'))
+        writer.write(b'.\n')
+        await writer.drain()
+
+    @staticmethod
+    async def _stream(movies, writer):
+        """ (Private) Write a line for each movie, waiting for the client now and then. """
+        lines = []
+        for movie in movies:
+            lines.append(movie.full_str() + '\n')
+            if len(lines) == STREAM_CHUNK:
+                writer.write(''.join(lines).encode('utf8'))
+                lines = []
+                await writer.drain()
+        writer.write(''.join(lines).encode('utf8'))
+
+
+class MovieClient:
+    """ A client for a MovieServer. One request at a time goes over its connection. """
+
+    def __init__(self, reader, writer):
+        """ Initialise a client on an open connection (see connect). """
+        self._reader = reader
+        self._writer = writer
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    async def connect(host='127.0.0.1', port=DEFAULT_PORT):
+        """ Return a client connected to the server at host and port. """
+        reader, writer = await asyncio.open_connection(host, port)
+        return MovieClient(reader, writer)
+
+    async def close(self):
+        """ Close the connection. """
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    async def request(self, *fields):
+        """ Send one request, and return the lines of its answer.
+
+        Raises ValueError if the server says the request was bad.
+        """
+        async with self._lock:
+            self._writer.write(('\t'.join(fields) + '\n').encode('utf8'))
+            await self._writer.drain()
+            lines = []
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    raise ConnectionError('the server closed the connection')
+                line = line.decode('utf8').rstrip('\n')
+                if line == '.':
+                    break
+                lines.append(line)
+        if not lines or lines[0] != 'OK':
+            raise ValueError(lines[0][len('ERROR '):] if lines else 'no answer')
+        return lines[1:]
+
+    async def search(self, title):
+        """ Return the full_str of the movie with title, or None. """
+        lines = await self.request('SEARCH', title)
+        if not lines:
+            return None
+        return lines[0]
+
+    async def range(self, lo=None, hi=None):
+        """ Return a list of the full_strs of the movies from lo up to hi. """
+        return await self.request('RANGE', lo or '', hi or '')
+
+    async def prefix(self, prefix):
+        """ Return a list of the full_strs of the movies whose titles start with prefix. """
+        return await self.request('PREFIX', prefix)
+
+    async def size(self):
+        """ Return the number of movies in the library. """
+        lines = await self.request('SIZE')
+        return int(lines[0])
+
+
+async def load_test(library, connections=100, requests=200, max_batch=MAX_BATCH, seed=0):
+    """ Serve library on a free localhost port and hammer it with searches.
+
+    Opens connections clients, each sending requests searches one after
+    another for titles picked at random (one in ten of them missing).
+    Returns a dict of the searches per second, the median and 99th
+    percentile latency in milliseconds, and the mean batch size.
+    """
+    rng = random.Random(seed)
+    titles = [movie.title for movie in library]
+    server = MovieServer(library, max_batch)
+    port = await server.start('127.0.0.1', 0)
+    clients = []
+    for _ in range(connections):
+        clients.append(await MovieClient.connect('127.0.0.1', port))
+    plans = []
+    for _ in range(connections):
+        plans.append([rng.choice(titles) if rng.random() >= 0.1 else '~missing ' + str(i)
+                      for i in range(requests)])
+    latencies = []
+
+    async def run(client, plan):
+        for title in plan:
+            start = time.perf_counter()
+            found = await client.search(title)
+            latencies.append(time.perf_counter() - start)
+            if (found is None) != title.startswith('~missing'):
+                raise AssertionError('wrong answer for ' + title)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run(client, plan) for client, plan in zip(clients, plans)])
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+    await server.stop()
+    latencies.sort()
+    batcher = server.batcher
+    return {'searches/sec': round(len(latencies) / elapsed),
+            'p50 ms': round(1000 * latencies[len(latencies) // 2], 3),
+            'p99 ms': round(1000 * latencies[int(len(latencies) * 0.99)], 3),
+            'per batch': round(batcher.searches / max(batcher.batches, 1), 1)}
+
+
+def main(argv=None):
+    """ Serve a library, or load test one, as the command line says. """
+    parser = argparse.ArgumentParser(description='Serve queries on a movie library over TCP.')
+    parser.add_argument('filename', help='the movie file to build the library from')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--backend', default='avl', help='the index backend (see Backends.py)')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH,
+                        help='the most searches to answer together (1 for no batching)')
+    parser.add_argument('--load', action='store_true',
+                        help='run a load test on localhost, with and without batching')
+    parser.add_argument('--connections', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=200, help='searches per connection')
+    args = parser.parse_args(argv)
+
+    library = build_library(args.filename, bulk=True, backend=args.backend)
+    if args.load:
+        for max_batch in (1, args.max_batch):
+            result = asyncio.run(load_test(library, args.connections, args.requests, max_batch))
+            print('max batch', max_batch, result)
+        return
+
+    async def serve():
+        server = MovieServer(library, args.max_batch)
+        port = await server.start(args.host, args.port)
+        print('serving', library.size(), 'movies on', args.host + ':' + str(port))
+        await server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+""" Binary snapshots of a sorted movie library, read back through mmap.
+
+A snapshot holds the movies of a library in title order, as flat columns:
+
+    header    magic b'MLIB', version, flags, number of titles, number of
+              movies, size of the string table
+    offsets   uint32 per title (+1): where each title starts in the strings
+    rowstarts int32 per title (+1): the first movie row of each title
+    dates     int32 per movie: the day number, or NONE
+    runtimes  int32 per movie: minutes, or NONE
+    strings   the UTF-8 encoded titles, one after another
+
+All numbers are little-endian, and each column starts on an 8 byte
+boundary. A title can have several movie rows (a multi-version library);
+otherwise rowstarts just counts up.
+
+The titles are sorted, so the tree layout is implicit: the root of the
+titles lo:hi is title (lo + hi) // 2, as in BSTNode.from_sorted. A
+SnapshotBST searches the file in place, and only makes elements for the
+titles that are asked for. UTF-8 bytes sort in the same order as the
+strings they encode, so searches compare the raw bytes.
+"""
+
+from array import array
+import mmap
+import struct
+import sys
+
+from Backends import implicit_tree_str
+
+MAGIC = b'MLIB'
+VERSION = 1
+MULTI = 1  # flag: a title may have several movie rows
+NONE = -2 ** 31  # stands for a missing date or runtime
+
+_HEADER = struct.Struct('<4sHHiiI')
+
+
+def _pad(size):
+    """ Return size rounded up to a multiple of 8. """
+    return (size + 7) // 8 * 8
+
+
+def _column(typecode, values):
+    """ Return the little-endian bytes of values, padded to 8 bytes. """
+    column = array(typecode, values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    data = column.tobytes()
+    return data + bytes(_pad(len(data)) - len(data))
+
+
+def write_snapshot(path, titles, multi=False):
+    """ Write a snapshot file.
+
+    Args:
+        path - the file to write
+        titles - a list of (title, versions) in title order, where versions
+                 is a list of (date, runtime) pairs; each is an int or None
+        multi - True if a title may have more than one version
+    """
+    strings = []
+    offsets = [0]
+    rowstarts = [0]
+    dates = []
+    runtimes = []
+    for title, versions in titles:
+        encoded = title.encode('utf8')
+        strings.append(encoded)
+        offsets.append(offsets[-1] + len(encoded))
+        for released, runtime in versions:
+            dates.append(NONE if released is None else released)
+            runtimes.append(NONE if runtime is None else runtime)
+        rowstarts.append(len(dates))
+    strings = b''.join(strings)
+
+    flags = MULTI if multi else 0
+    header = _HEADER.pack(MAGIC, VERSION, flags, len(titles), len(dates), len(strings))
+    file = open(path, 'wb')
+    file.write(header + bytes(_pad(len(header)) - len(header)))
+    file.write(_column('I', offsets))
+    file.write(_column('i', rowstarts))
+    file.write(_column('i', dates))
+    file.write(_column('i', runtimes))
+    file.write(strings)
+    file.close()
+
+
+class SnapshotBST:
+    """ A read-only sorted tree of titles, held in a memory-mapped snapshot.
+
+    Has the reading methods of an index (search_key, rank, select, items,
+    ...; see Backends.py), so a MovieLib can use one until it is first
+    changed.
+    """
+
+    def __init__(self, path, factory):
+        """ Open the snapshot at path.
+
+        Args:
+            path - a file written by write_snapshot
+            factory - called as factory(title, versions), with versions a
+                      list of (date, runtime) pairs, to make the element for
+                      a title when it is needed
+        """
+        file = open(path, 'rb')
+        self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        file.close()
+        magic, version, flags, ntitles, nrows, strbytes = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + ' is not a movie library snapshot')
+        self._factory = factory
+        self.multi = bool(flags & MULTI)
+        self._count = ntitles
+
+        position = _pad(_HEADER.size)
+        self._offsets, position = self._view('I', position, ntitles + 1)
+        self._rowstarts, position = self._view('i', position, ntitles + 1)
+        self._dates, position = self._view('i', position, nrows)
+        self._runtimes, position = self._view('i', position, nrows)
+        self._strings = position
+
+    def _view(self, typecode, position, count):
+        """ (Private) Return (column, next position) for count numbers at position.
+
+        The column reads straight from the mapped file, unless this machine
+        is big-endian, when it has to be copied and swapped.
+        """
+        size = count * array(typecode).itemsize
+        view = memoryview(self._map)[position:position + size].cast(typecode)
+        if sys.byteorder == 'big':
+            view = array(typecode, view)
+            view.byteswap()
+        return view, position + _pad(size)
+
+    def __str__(self):
+        """ Return a string representation of the tree.
+
+        The string will be created by an in-order traversal, in the same
+        format as BSTNode.
+        """
+        return implicit_tree_str(self._count, self._title)
+
+    __repr__ = __str__
+
+    # READING ROWS
+
+    def _titlebytes(self, i):
+        """ (Private) Return the encoded title number i. """
+        return self._map[self._strings + self._offsets[i]:self._strings + self._offsets[i + 1]]
+
+    def _title(self, i):
+        """ (Private) Return title number i. """
+        return self._titlebytes(i).decode('utf8')
+
+    def _element(self, i):
+        """ (Private) Make the element for title number i. """
+        versions = []
+        for row in range(self._rowstarts[i], self._rowstarts[i + 1]):
+            released = self._dates[row]
+            runtime = self._runtimes[row]
+            versions.append((None if released == NONE else released,
+                             None if runtime == NONE else runtime))
+        return self._factory(self._title(i), versions)
+
+    def _bisect(self, key):
+        """ (Private) Return the number of titles before key. """
+        target = key.encode('utf8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._titlebytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # SEARCHING
+
+    def search_key(self, key):
+        """ Return the element whose title is key, or None. """
+        i = self._bisect(key)
+        if i < self._count and self._titlebytes(i) == key.encode('utf8'):
+            return self._element(i)
+        return None
+
+    def search_many(self, keys):
+        """ Return a list of the elements whose titles are keys (None where missing).
+
+        The titles are sorted and found in order, each search starting
+        where the one before it ended.
+        """
+        found = {}
+        start = 0
+        for key in sorted(set(keys)):
+            target = key.encode('utf8')
+            lo, hi = start, self._count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._titlebytes(mid) < target:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo < self._count and self._titlebytes(lo) == target:
+                found[key] = self._element(lo)
+            start = lo
+        return [found.get(key) for key in keys]
+
+    def __iter__(self):
+        """ Yield the elements in title order. """
+        return self.items()
+
+    def items(self, lo=None, hi=None):
+        """ Yield the elements with titles from lo (inclusive) to hi (exclusive). """
+        start = 0
+        end = self._count
+        if lo is not None:
+            start = self._bisect(lo)
+        if hi is not None:
+            end = self._bisect(hi)
+        for i in range(start, end):
+            yield self._element(i)
+
+    def size(self):
+        """ Return the number of titles. """
+        return self._count
+
+    def rank(self, key):
+        """ Return the number of titles before key. """
+        return self._bisect(key)
+
+    def select(self, k):
+        """ Return the element at (zero-based) position k, or None. """
+        if k < 0 or k >= self._count:
+            return None
+        return self._element(k)
+
+    def height(self):
+        """ Return the height of the implicit, perfectly balanced tree. """
+        return self._count.bit_length() - 1
+
+    def _stats(self):
+        """ Return the basic stats on the tree. """
+        return 'size = ' + str(self.size()) + '; height = ' + str(self.height())
+
+    def _properBST(self):
+        """ Return True if the titles are in strictly increasing order. """
+        for i in range(1, self._count):
+            if not self._titlebytes(i - 1) < self._titlebytes(i):
+                return False
+        return True
@@ -0,0 +1,349 @@
+""" A readers-writer lock, and a MovieLib wrapper that can be shared between threads.
+
+Any number of threads can search a ThreadSafeMovieLib at once, while an
+add or remove waits for them to finish and then has the library to
+itself. Writers are preferred: once one is waiting, new readers wait
+behind it, so a steady stream of searches can't hold off a change for ever.
+
+(In CPython the searches still take turns on the interpreter lock, so
+more reader threads give no more raw speed; what the lock buys is that
+readers never wait for each other, only for writers.)
+"""
+
+from contextlib import contextmanager
+import random
+import threading
+import time
+
+from MovieLibrary import MovieLib, build_library
+
+
+class RWLock:
+    """ A writer-preferring readers-writer lock. Not reentrant. """
+
+    def __init__(self):
+        """ Initialise an unlocked lock. """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0  # threads holding the lock to read
+        self._writer = False  # True while a thread holds it to write
+        self._waiting = 0  # writers waiting for it
+
+    def acquire_read(self):
+        """ Wait until no writer holds or is waiting for the lock, then share it. """
+        with self._cond:
+            while self._writer or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        """ Give up a share of the lock taken with acquire_read. """
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        """ Wait until no one else holds the lock, then take it alone. """
+        with self._cond:
+            self._waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        """ Give up the lock taken with acquire_write. """
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def reading(self):
+        """ Hold a share of the lock for the body of a with statement. """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        """ Hold the lock alone for the body of a with statement. """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class ThreadSafeMovieLib:
+    """ A MovieLib that can be used from many threads at once.
+
+    Reads share a readers-writer lock and changes take it alone. Methods
+    that yield movies (range, prefix, released_between, runtime_between
+    and iteration) return lists instead, taken while the lock is held.
+
+    A search of a library with a cache, or counting its operations (see
+    MovieLib.enable_stats), changes the cache or the counts, so while the
+    library has either, searches take the lock alone too.
+
+    Lazy libraries (build_library(lazy=True)) are supported: their index
+    only reads the mapped file, making new Movies for each search, so
+    readers can share it, and the first change, which reads it all into
+    an ordinary index, holds the lock alone as every change does.
+    """
+
+    def __init__(self, library=None):
+        """ Initialise a wrapper around library (a new, empty MovieLib if None). """
+        if library is None:
+            library = MovieLib()
+        self.library = library
+        self.lock = RWLock()
+
+    def __str__(self):
+        """ Return a string representation of the library. """
+        with self.lock.reading():
+            return str(self.library)
+
+    __repr__ = __str__
+
+    def __iter__(self):
+        """ Return an iterator over a list of the movies in title order. """
+        with self.lock.reading():
+            return iter(list(self.library))
+
+    def _searching(self):
+        """ (Private) Return the context manager to hold while searching. """
+        if self.library._cache is not None or self.library._opstats is not None:
+            return self.lock.writing()
+        return self.lock.reading()
+
+    # READING
+
+    def search(self, title):
+        """ Return Movie with matching title if there, or None. """
+        with self._searching():
+            return self.library.search(title)
+
+    def search_many(self, titles):
+        """ Return a list of the Movies with each of titles (see MovieLib.search_many). """
+        with self._searching():
+            return self.library.search_many(titles)
+
+    def search_all(self, title):
+        """ Return a list of every Movie with matching title, oldest first. """
+        with self._searching():
+            return self.library.search_all(title)
+
+    def size(self):
+        """ Return the number of movies in the library. """
+        with self.lock.reading():
+            return self.library.size()
+
+    def rank(self, title):
+        """ Return the number of movies whose titles come before title. """
+        with self.lock.reading():
+            return self.library.rank(title)
+
+    def select(self, k):
+        """ Return the Movie at zero-based position k in title order, or None. """
+        with self.lock.reading():
+            return self.library.select(k)
+
+    def range(self, lo=None, hi=None):
+        """ Return a list of the movies with titles from lo (inclusive) to hi (exclusive). """
+        with self.lock.reading():
+            return list(self.library.range(lo, hi))
+
+    def prefix(self, prefix):
+        """ Return a list of the movies whose titles start with prefix. """
+        with self.lock.reading():
+            return list(self.library.prefix(prefix))
+
+    def complete(self, prefix, k=10, order='title'):
+        """ Return a list of up to k Movies whose titles start with prefix (see MovieLib). """
+        with self.lock.reading():
+            return self.library.complete(prefix, k, order)
+
+    def search_folded(self, title):
+        """ Return a list of the Movies whose titles match title ignoring case and accents. """
+        with self._searching():
+            return self.library.search_folded(title)
+
+    def search_fuzzy(self, title, k=10, threshold=0.3):
+        """ Return a list of up to k (similarity, Movie) pairs (see MovieLib.search_fuzzy). """
+        with self._searching():
+            return self.library.search_fuzzy(title, k, threshold)
+
+    def released_between(self, lo=None, hi=None):
+        """ Return a list of the movies released from lo (inclusive) to hi (exclusive). """
+        with self.lock.reading():
+            return list(self.library.released_between(lo, hi))
+
+    def runtime_between(self, lo=None, hi=None):
+        """ Return a list of the movies running from lo (inclusive) to hi (exclusive) minutes. """
+        with self.lock.reading():
+            return list(self.library.runtime_between(lo, hi))
+
+    def query(self, released=None, runtime=None):
+        """ Return a list of the movies matching all of the given conditions. """
+        with self.lock.reading():
+            return self.library.query(released, runtime)
+
+    def save(self, path):
+        """ Write the library to path as a binary snapshot. """
+        with self.lock.reading():
+            self.library.save(path)
+
+    def _stats(self):
+        """ Return the stats on the library. """
+        with self.lock.reading():
+            return self.library._stats()
+
+    # WRITING
+
+    def add(self, title, date, runtime):
+        """ Add a new movie to the library; returns the same as MovieLib.add. """
+        with self.lock.writing():
+            return self.library.add(title, date, runtime)
+
+    def add_movie(self, newMovie):
+        """ Add a Movie object to the library; returns the same as MovieLib.add. """
+        with self.lock.writing():
+            return self.library.add_movie(newMovie)
+
+    def remove(self, title):
+        """ Remove and return the movie with the given title, if there. """
+        with self.lock.writing():
+            return self.library.remove(title)
+
+    def bulk_load(self, movies):
+        """ Replace the contents of the library with movies (see MovieLib.bulk_load). """
+        with self.lock.writing():
+            self.library.bulk_load(movies)
+
+    def enable_stats(self):
+        """ Start counting the work done by each operation; return the TreeStats. """
+        with self.lock.writing():
+            return self.library.enable_stats()
+
+    def disable_stats(self):
+        """ Stop counting the work done by each operation. """
+        with self.lock.writing():
+            self.library.disable_stats()
+
+    # MISC CODE
+
+    @staticmethod
+    def _stress(filename='movies.txt', threads=8, operations=2000, balanced=True, seed=0,
+                lazy=False):
+        """ Hammer a shared library from many threads, then check it is intact.
+
+        Each thread first reads every movie's date, all at the same time,
+        and once they all have, runs operations random operations: mostly
+        searches (checking the date of the movie found), range and prefix
+        reads, with some adds and removes of titles of its own (so the
+        final contents are known). Afterwards the tree must be a proper BST
+        holding exactly the expected titles. With lazy=True the library is
+        built with build_library(lazy=True), so the first reads all search
+        the mapped file together. Prints the operations per second (the
+        first reads included), and returns True if the checks pass.
+        """
+        library = ThreadSafeMovieLib(build_library(filename, balanced=balanced, lazy=lazy))
+        titles = [movie.title for movie in library]
+        dates = {}
+        if lazy:
+            # read the dates from a library of ordinary Movies, to check the lazy ones against
+            for movie in build_library(filename, balanced=balanced):
+                dates[movie.title] = movie.date
+        else:
+            for movie in library:
+                dates[movie.title] = movie.date
+        expected = set(titles)
+        errors = []
+        mine = []  # mine[i] is the set of titles thread i has added and not removed
+
+        start = threading.Barrier(threads)
+        read = threading.Barrier(threads)
+
+        def worker(number):
+            rng = random.Random(seed + number)
+            added = set()
+            try:
+                # all the threads start by reading every date together, so
+                # that with lazy=True they search the mapped file at once;
+                # none adds a title until they all have
+                start.wait()
+                for movie in library.range():
+                    if movie.date != dates[movie.title]:
+                        errors.append(movie.title + ' has date ' + str(movie.date))
+                read.wait()
+                for i in range(operations):
+                    choice = rng.random()
+                    if choice < 0.1:
+                        title = '~thread ' + str(number) + ' movie ' + str(rng.randrange(50))
+                        if title in added:
+                            if library.remove(title) is None:
+                                errors.append('thread ' + str(number) + ' lost ' + title)
+                            added.discard(title)
+                        else:
+                            if library.add(title, None, None) is None:
+                                errors.append('thread ' + str(number) + ' could not add ' + title)
+                            added.add(title)
+                    elif choice < 0.8:
+                        title = rng.choice(titles)
+                        movie = library.search(title)
+                        if movie is None or movie.title != title:
+                            errors.append('search for ' + title + ' gave ' + str(movie))
+                        elif movie.date != dates[title]:
+                            errors.append(title + ' has date ' + str(movie.date))
+                    elif choice < 0.9:
+                        lo = rng.choice(titles)
+                        found = library.range(lo, lo + '~')
+                        if not found or found[0].title != lo:
+                            errors.append('range from ' + lo + ' missed it')
+                    else:
+                        library.size()
+                        library.select(rng.randrange(len(titles)))
+            except Exception as error:
+                errors.append('thread ' + str(number) + ' raised ' + repr(error))
+                read.abort()  # don't leave the others waiting for this one
+            mine.append(added)
+
+        pool = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+        started = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        for added in mine:
+            expected |= added
+        if not library.library.index._properBST():
+            errors.append('the title index is not a proper BST')
+        if set(movie.title for movie in library) != expected:
+            errors.append('the library does not hold the expected titles')
+        if library.size() != len(expected):
+            errors.append('the library size is wrong')
+        print(threads, 'threads x', operations, 'operations:',
+              round(threads * operations / elapsed), 'ops/sec')
+        for error in errors[:10]:
+            print('ERROR:', error)
+        return not errors
+
+    @staticmethod
+    def _test():
+        library = ThreadSafeMovieLib()
+        print(library.add('Alien', None, 117))
+        print(library.add('Heat', None, 170))
+        print(library.add('Alien', None, 117))
+        print('search Heat:', library.search('Heat'), '- size:', library.size())
+        print('range A to B:', library.range('A', 'B'))
+        print('remove Alien:', library.remove('Alien'), '- library:', library)
+        print('stress test passed:', ThreadSafeMovieLib._stress(threads=4, operations=500))
+        print('lazy stress test passed:',
+              ThreadSafeMovieLib._stress(threads=4, operations=500, lazy=True))
+
+
+# ThreadSafeMovieLib._test()
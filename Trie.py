@@ -0,0 +1,336 @@
+""" Class definition for a radix tree (a compressed trie) of string keys.
+
+Each edge is labelled with a piece of a key, and a node with a single
+child is merged into it, so the tree has at most two nodes per key. A
+node's children are kept in a dict by the first character of their
+label, with those characters also in a sorted list, so the keys starting
+with a prefix can be listed in order without sorting.
+
+Every key has a value and an optional rank (any comparable, such as a
+release date), and every node keeps the highest and lowest rank below
+it, so the best ranked keys with a prefix can be found without looking
+at the rest.
+
+MovieLib uses a Trie for autocomplete (see MovieLib(autocomplete=True)).
+"""
+
+from bisect import bisect_left, insort
+import heapq
+
+
+class TrieNode:
+    """ A node of a Trie: the label on the edge into it, and what is below. """
+
+    __slots__ = ('label', 'children', 'order', 'terminal', 'value', 'rank',
+                 'count', 'hi', 'lo')
+
+    def __init__(self, label):
+        """ Initialise a node with no key and no children. """
+        self.label = label
+        self.children = {}  # first character of the child's label -> child
+        self.order = []  # the children's first characters, sorted
+        self.terminal = False  # True if a key ends here
+        self.value = None
+        self.rank = None
+        self.count = 0  # keys at or below here
+        self.hi = None  # highest rank at or below here, or None if no ranks
+        self.lo = None  # lowest rank at or below here
+
+    def _update(self):
+        """ (Private) Recompute count, hi and lo from this node and its children. """
+        count = 0
+        hi = None
+        lo = None
+        if self.terminal:
+            count = 1
+            hi = lo = self.rank
+        for child in self.children.values():
+            count += child.count
+            if child.hi is not None and (hi is None or hi < child.hi):
+                hi = child.hi
+            if child.lo is not None and (lo is None or child.lo < lo):
+                lo = child.lo
+        self.count = count
+        self.hi = hi
+        self.lo = lo
+
+    def _addchild(self, child):
+        """ (Private) Add child, whose label must start with a new character. """
+        self.children[child.label[0]] = child
+        insort(self.order, child.label[0])
+
+    def _removechild(self, first):
+        """ (Private) Remove the child whose label starts with first. """
+        del self.children[first]
+        del self.order[bisect_left(self.order, first)]
+
+
+class Trie:
+    """ A radix tree mapping string keys to values, with optional ranks. """
+
+    def __init__(self):
+        """ Initialise an empty trie. """
+        self._root = TrieNode('')
+
+    def __str__(self):
+        """ Return the keys in order, as a string. """
+        return '{' + ', '.join(self) + '}'
+
+    __repr__ = __str__
+
+    def __len__(self):
+        """ Return the number of keys. """
+        return self._root.count
+
+    def __contains__(self, key):
+        """ Return True if key is in the trie. """
+        node = self._find(key)
+        return node is not None and node.terminal
+
+    def __iter__(self):
+        """ Yield the keys in order. """
+        stack = [(self._root, '')]
+        while stack:
+            node, key = stack.pop()
+            key += node.label
+            if node.terminal:
+                yield key
+            for first in reversed(node.order):
+                stack.append((node.children[first], key))
+
+    # FINDING NODES
+
+    def _find(self, key):
+        """ (Private) Return the node where key ends, or None if no key goes there. """
+        node = self._root
+        i = 0
+        while i < len(key):
+            node = node.children.get(key[i])
+            if node is None or not key.startswith(node.label, i):
+                return None
+            i += len(node.label)
+        return node
+
+    def _subtree(self, prefix):
+        """ (Private) Return the node holding just the keys starting with prefix, or None. """
+        node = self._root
+        i = 0
+        while i < len(prefix):
+            node = node.children.get(prefix[i])
+            if node is None:
+                return None
+            if prefix.startswith(node.label, i):
+                i += len(node.label)
+            elif node.label.startswith(prefix[i:]):
+                return node  # the prefix ends part way along this edge
+            else:
+                return None
+        return node
+
+    def get(self, key):
+        """ Return the value of key, or None if it isn't there. """
+        node = self._find(key)
+        if node is None or not node.terminal:
+            return None
+        return node.value
+
+    # ADDING AND REMOVING KEYS
+
+    def add(self, key, value, rank=None):
+        """ Set the value and rank of key, adding it if need be.
+
+        Returns True if key is new, and False if it was already there.
+        """
+        path = [self._root]
+        node = self._root
+        i = 0
+        while i < len(key):
+            child = node.children.get(key[i])
+            if child is None:
+                child = TrieNode(key[i:])
+                node._addchild(child)
+                i = len(key)
+            else:
+                # the length of the common start of the label and the rest of key
+                common = 0
+                label = child.label
+                while common < len(label) and i + common < len(key) \
+                        and label[common] == key[i + common]:
+                    common += 1
+                if common < len(label):
+                    # split the edge, with a new node where key leaves it
+                    middle = TrieNode(label[:common])
+                    child.label = label[common:]
+                    middle._addchild(child)
+                    middle._update()
+                    node.children[key[i]] = middle
+                    child = middle
+                i += common
+            node = child
+            path.append(node)
+        added = not node.terminal
+        node.terminal = True
+        node.value = value
+        node.rank = rank
+        for node in reversed(path):
+            node._update()
+        return added
+
+    def remove(self, key):
+        """ Remove key, and return its value (or None if it wasn't there). """
+        path = [self._root]
+        node = self._root
+        i = 0
+        while i < len(key):
+            node = node.children.get(key[i])
+            if node is None or not key.startswith(node.label, i):
+                return None
+            i += len(node.label)
+            path.append(node)
+        if not node.terminal:
+            return None
+        value = node.value
+        node.terminal = False
+        node.value = None
+        node.rank = None
+
+        # drop the node if it is now empty, then merge away a node left
+        # with one child and no key of its own
+        if len(path) > 1 and not node.children:
+            path.pop()
+            path[-1]._removechild(node.label[0])
+            node = path[-1]
+        if len(path) > 1 and not node.terminal and len(node.children) == 1:
+            child = node.children[node.order[0]]
+            child.label = node.label + child.label
+            path.pop()
+            path[-1].children[child.label[0]] = child
+        for node in reversed(path):
+            node._update()
+        return value
+
+    # COMPLETIONS
+
+    def complete(self, prefix, k=None):
+        """ Return a list of the values of the first k keys starting with prefix.
+
+        The keys are taken in order; k=None takes them all. Takes
+        O(len(prefix) + k) steps, as no key after the kth is looked at.
+        """
+        results = []
+        start = self._subtree(prefix)
+        if start is None:
+            return results
+        stack = [start]
+        while stack and (k is None or len(results) < k):
+            node = stack.pop()
+            if node.terminal:
+                results.append(node.value)
+            for first in reversed(node.order):
+                stack.append(node.children[first])
+        return results
+
+    def top(self, prefix, k, highest=True):
+        """ Return a list of the values of the k best ranked keys starting with prefix.
+
+        With highest=True the highest ranks come first, and otherwise the
+        lowest. Keys with no rank come after all the others. Subtrees are
+        explored best first, by the best rank below them, so only the
+        paths to the k keys returned and their siblings are looked at.
+        """
+        results = []
+        start = self._subtree(prefix)
+        if start is None or k <= 0:
+            return results
+        # entries are (priority, tiebreak, node, is the node's own key)
+        heap = []
+        tiebreak = 0
+        heapq.heappush(heap, (self._priority(start, highest, False), tiebreak, start, False))
+        while heap and len(results) < k:
+            _, _, node, own = heapq.heappop(heap)
+            if own:
+                results.append(node.value)
+                continue
+            if node.terminal:
+                tiebreak += 1
+                heapq.heappush(heap, (self._priority(node, highest, True), tiebreak, node, True))
+            for first in node.order:
+                child = node.children[first]
+                tiebreak += 1
+                heapq.heappush(heap, (self._priority(child, highest, False), tiebreak, child, False))
+        return results
+
+    @staticmethod
+    def _priority(node, highest, own):
+        """ (Private) Return the heap priority of node's own key, or of its subtree. """
+        if own:
+            rank = node.rank
+        elif highest:
+            rank = node.hi
+        else:
+            rank = node.lo
+        if rank is None:
+            return 1, 0
+        if highest:
+            return 0, _Reversed(rank)
+        return 0, rank
+
+    # MISC CODE
+
+    def _properTrie(self):
+        """ Return True if the trie is properly formed; False otherwise.
+
+        Checks that every child is filed under the first character of its
+        label, that no node but the root is empty or could be merged into
+        its only child, and that every count and rank bound is right.
+        """
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if sorted(node.children) != node.order:
+                return False
+            for first in node.order:
+                child = node.children[first]
+                if not child.label or child.label[0] != first:
+                    return False
+                if not child.terminal and len(child.children) < 2:
+                    return False
+                stack.append(child)
+            count, hi, lo = node.count, node.hi, node.lo
+            node._update()
+            if (count, hi, lo) != (node.count, node.hi, node.lo):
+                return False
+        return True
+
+    @staticmethod
+    def _test():
+        trie = Trie()
+        for key, rank in (('Melody', 2007), ('Memento', 2000), ('Melvin and Howard', 1980),
+                          ('Mellow Mud', 2016), ('Me', None), ('Mean Streets', 1973)):
+            trie.add(key, key, rank)
+        print('Keys:', trie)
+        print('complete Mel:', trie.complete('Mel'))
+        print('first 2 for Me:', trie.complete('Me', 2))
+        print('newest 3 for Me:', trie.top('Me', 3))
+        print('oldest 3 for Me:', trie.top('Me', 3, highest=False))
+        for key in ('Mel', 'Melody', 'Me', 'Mellow Mud'):
+            print('removing', key, '->', trie.remove(key))
+            print('Keys:', trie, '- proper trie:', trie._properTrie())
+
+
+class _Reversed:
+    """ Wraps a value so that it sorts in reverse. """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+# Trie._test()
@@ -0,0 +1,442 @@
+""" Benchmarks for MovieLib, its index backends and the ADT classes.
+
+Run from this directory:
+
+    python benchmark.py                      # everything, printed as a table
+    python benchmark.py --json run.json      # ... and saved for later
+    python benchmark.py --compare run.json   # ... and compared with a saved run
+    python benchmark.py --quick              # skip movies.txt, one repeat
+    python benchmark.py --only build/small   # just the names starting so
+
+Each benchmark is timed repeat times (each time long enough to be worth
+measuring, running it several times over if need be) and the best rate
+is kept, in operations per second. It is then run once more under
+tracemalloc for its peak memory, and, for a library, the height of its
+index is recorded. Every random choice comes from --seed, so two runs
+with the same options do the same work.
+
+The groups are:
+
+    build   build_library on smallmovies.txt, small_repeated_movies.txt and
+            movies.txt, as given, shuffled and sorted by title, for each
+            backend, and once with bulk=True; one operation is one line
+    mix     searches, adds and removes on a library of movies.txt, for each
+            backend, in three proportions
+    adt     the Queue, Stack, Map and Set classes
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import MovieLibrary
+import QueueADT
+import StackADT
+from Backends import BACKENDS
+
+DATASETS = ('smallmovies.txt', 'small_repeated_movies.txt', 'movies.txt')
+ORDERS = ('file', 'shuffled', 'sorted')
+
+# an unbalanced tree built from sorted titles is a list: quadratic to build
+UNBALANCED = ('bst', 'arraybst', 'persistent')
+UNBALANCED_LIMIT = 5000
+
+# (name, share of searches, share of adds, share of removes)
+MIXES = (('search', 1.0, 0.0, 0.0),
+         ('read-heavy', 0.9, 0.05, 0.05),
+         ('write-heavy', 0.5, 0.25, 0.25))
+MIX_OPS = 20000
+MISS_RATE = 0.1  # share of searches and removes for titles that aren't there
+
+MIN_TIME = 0.05  # seconds: shorter runs are repeated until they take this long
+
+
+def _load_module(filename, name):
+    """ Return the module in filename, whose name may not be importable (it has spaces). """
+    spec = importlib.util.spec_from_file_location(name, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(setup, run, repeat):
+    """ Return (ops per second, seconds per run, peak bytes, state) for a benchmark.
+
+    Args:
+        setup - called with no arguments before every run, untimed; returns
+                the state for the run
+        run - called with that state; does the work and returns the number
+              of operations it did
+        repeat - how many timings to take the best of
+
+    The state returned is from the final run, made under tracemalloc.
+    """
+    best = 0.0
+    seconds = None
+    for _ in range(repeat):
+        total = 0.0
+        ops = 0
+        calls = 0
+        while calls == 0 or total < MIN_TIME:
+            state = setup()
+            start = time.perf_counter()
+            ops += run(state)
+            total += time.perf_counter() - start
+            calls += 1
+        if ops / total > best:
+            best = ops / total
+            seconds = total / calls
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, seconds, peak, state
+
+
+# BUILDING LIBRARIES
+
+def _variant(filename, order, seed, tmpdir):
+    """ Return the path of filename with its lines in the given order. """
+    if order == 'file':
+        return filename
+    file = open(filename, 'r', encoding='utf8')
+    lines = [line if line.endswith('\n') else line + '\n' for line in file]
+    file.close()
+    if order == 'shuffled':
+        random.Random(seed).shuffle(lines)
+    else:
+        lines.sort(key=lambda line: line.split('\t')[0])
+    path = os.path.join(tmpdir, order + '-' + os.path.basename(filename))
+    file = open(path, 'w', encoding='utf8')
+    file.writelines(lines)
+    file.close()
+    return path
+
+
+def _build_benchmark(path, backend, bulk):
+    """ Return (setup, run) that build a library from path. """
+    def setup():
+        return {}
+
+    def run(state):
+        # build_library prints a summary; keep it out of the table
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            state['library'] = MovieLibrary.build_library(path, bulk=bulk, backend=backend)
+        return int(output.getvalue().split()[4])  # 'read a file with N movies'
+
+    return setup, run
+
+
+def build_benchmarks(datasets, seed, tmpdir):
+    """ Yield (name, params, setup, run, skip) for the build group. """
+    for filename in datasets:
+        file = open(filename, 'r', encoding='utf8')
+        lines = sum(1 for _ in file)
+        file.close()
+        for order in ORDERS:
+            path = _variant(filename, order, seed, tmpdir)
+            for backend in sorted(BACKENDS):
+                name = 'build/' + filename + '/' + order + '/' + backend
+                params = {'dataset': filename, 'order': order, 'backend': backend, 'bulk': False}
+                skip = None
+                if order == 'sorted' and backend in UNBALANCED and lines > UNBALANCED_LIMIT:
+                    skip = 'an unbalanced tree is quadratic to build from sorted input'
+                setup, run = _build_benchmark(path, backend, False)
+                yield name, params, setup, run, skip
+        params = {'dataset': filename, 'order': 'file', 'backend': 'bst', 'bulk': True}
+        setup, run = _build_benchmark(filename, 'bst', True)
+        yield 'build/' + filename + '/file/bst-bulk', params, setup, run, None
+
+
+# SEARCH/ADD/REMOVE MIXES
+
+def _workload(titles, searches, adds, seed):
+    """ Return a list of (operation, title) pairs for a mix.
+
+    Added titles are new ones spread among the existing titles; a share of
+    the searches and removes are for titles that aren't there.
+    """
+    rng = random.Random(seed)
+    workload = []
+    for i in range(MIX_OPS):
+        choice = rng.random()
+        title = rng.choice(titles)
+        if choice < searches:
+            operation = 'search'
+        elif choice < searches + adds:
+            workload.append(('add', title + ' (' + str(i) + ')'))
+            continue
+        else:
+            operation = 'remove'
+        if rng.random() < MISS_RATE:
+            title += ' (missing)'
+        workload.append((operation, title))
+    return workload
+
+
+def _mix_benchmark(movies, backend, workload):
+    """ Return (setup, run) that apply workload to a library of movies. """
+    def setup():
+        library = MovieLibrary.MovieLib(backend=backend)
+        library.bulk_load(movies)
+        return {'library': library}
+
+    def run(state):
+        library = state['library']
+        for operation, title in workload:
+            if operation == 'search':
+                library.search(title)
+            elif operation == 'add':
+                library.add(title, None, None)
+            else:
+                library.remove(title)
+        return len(workload)
+
+    return setup, run
+
+
+def mix_benchmarks(seed):
+    """ Yield (name, params, setup, run, skip) for the mix group. """
+    bytitle = {}
+    for movie in MovieLibrary._read_movies('movies.txt'):
+        if movie.title not in bytitle:
+            bytitle[movie.title] = movie
+    titles = sorted(bytitle)
+    movies = [bytitle[title] for title in titles]
+    for mix, searches, adds, removes in MIXES:
+        workload = _workload(titles, searches, adds, seed)
+        for backend in sorted(BACKENDS):
+            setup, run = _mix_benchmark(movies, backend, workload)
+            params = {'mix': mix, 'backend': backend, 'search': searches, 'add': adds,
+                      'remove': removes, 'ops': MIX_OPS}
+            yield 'mix/' + mix + '/' + backend, params, setup, run, None
+
+
+# THE ADT CLASSES
+
+def _queue_benchmark(queueclass, n):
+    """ Return (setup, run) that fill a queue with n items and empty it. """
+    def setup():
+        return {}
+
+    def run(state):
+        queue = queueclass()
+        for i in range(n):
+            queue.enqueue(i)
+        while queue.length() > 0:
+            queue.dequeue()
+        return 2 * n
+
+    return setup, run
+
+
+def _stack_benchmark(n):
+    """ Return (setup, run) that push n items on a stack and pop them. """
+    def setup():
+        return {}
+
+    def run(state):
+        stack = StackADT.Stack()
+        for i in range(n):
+            stack.push(i)
+            stack.top()
+        while stack.length() > 0:
+            stack.pop()
+        return 3 * n
+
+    return setup, run
+
+
+def _map_benchmark(mapclass, n):
+    """ Return (setup, run) that set n keys, get each one, and delete them all. """
+    def setup():
+        return {}
+
+    def run(state):
+        table = mapclass()
+        for i in range(n):
+            table.setitem(i, i)
+        for i in range(n):
+            table.getitem(i)
+        for i in range(n):
+            table.delitem(i)
+        return 3 * n
+
+    return setup, run
+
+
+def _set_benchmark(setclass, n):
+    """ Return (setup, run) that add n items (and n repeats), test and delete them. """
+    def setup():
+        return {}
+
+    def run(state):
+        items = setclass()
+        for i in range(n):
+            items.add(i)
+        for i in range(n):
+            items.add(i)
+        for i in range(n):
+            items.contains(i)
+        for i in range(n):
+            items.delete(i)
+        return 4 * n
+
+    return setup, run
+
+
+def adt_benchmarks(quick):
+    """ Yield (name, params, setup, run, skip) for the adt group.
+
+    The array based Map and Set are O(n) per operation, so they get fewer items.
+    """
+    scale = 1
+    if quick:
+        scale = 10
+    mapmodule = _load_module('Map ADT.py', 'map_adt')
+    setmodule = _load_module('Set ADT.py', 'set_adt')
+    for queueclass in (QueueADT.QueueA, QueueADT.QueueB, QueueADT.Queue):
+        n = 100000 // scale
+        setup, run = _queue_benchmark(queueclass, n)
+        yield 'adt/queue/' + queueclass.__name__, {'n': n}, setup, run, None
+    n = 100000 // scale
+    setup, run = _stack_benchmark(n)
+    yield 'adt/stack/Stack', {'n': n}, setup, run, None
+    n = 2000 // scale
+    setup, run = _map_benchmark(mapmodule.Map, n)
+    yield 'adt/map/Map', {'n': n}, setup, run, None
+    setup, run = _set_benchmark(setmodule.Set, n)
+    yield 'adt/set/Set', {'n': n}, setup, run, None
+
+
+# RUNNING AND REPORTING
+
+def _git_commit():
+    """ Return the current git commit, or None if it can't be found. """
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+
+def run_benchmarks(quick=False, repeat=3, seed=0, only=None, out=sys.stdout):
+    """ Run the benchmarks and return the results, as a dict ready for JSON. """
+    datasets = DATASETS
+    if quick:
+        datasets = DATASETS[:2]
+    tmpdir = tempfile.mkdtemp()
+    groups = [build_benchmarks(datasets, seed, tmpdir), adt_benchmarks(quick)]
+    if not quick:
+        groups.insert(1, mix_benchmarks(seed))
+    results = []
+    try:
+        for group in groups:
+            for name, params, setup, run, skip in group:
+                if only is not None and not name.startswith(only):
+                    continue
+                result = {'name': name, 'params': params}
+                if skip is not None:
+                    result['skipped'] = skip
+                else:
+                    rate, seconds, peak, state = measure(setup, run, repeat)
+                    result['ops_per_sec'] = round(rate, 1)
+                    result['seconds'] = round(seconds, 6)
+                    result['peak_kib'] = round(peak / 1024, 1)
+                    if 'library' in state:
+                        result['height'] = state['library'].index.height()
+                        result['size'] = state['library'].size()
+                results.append(result)
+                print(_format(result), file=out)
+    finally:
+        shutil.rmtree(tmpdir)
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'commit': _git_commit(),
+            'quick': quick,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def _format(result):
+    """ Return one line of the results table. """
+    if 'skipped' in result:
+        return '%-50s skipped: %s' % (result['name'], result['skipped'])
+    line = '%-50s %14.1f ops/s %10.1f KiB' % (result['name'], result['ops_per_sec'],
+                                              result['peak_kib'])
+    if 'height' in result:
+        line += '   height %d' % result['height']
+    return line
+
+
+def compare(old, new, out=sys.stdout):
+    """ Print the speed of each benchmark in new relative to old (both result dicts). """
+    before = {}
+    for result in old['results']:
+        if 'ops_per_sec' in result:
+            before[result['name']] = result
+    print('%-50s %10s %10s' % ('compared with ' + str(old['meta'].get('commit')), 'speed', 'memory'),
+          file=out)
+    for result in new['results']:
+        if 'ops_per_sec' not in result or result['name'] not in before:
+            continue
+        was = before[result['name']]
+        memory = '-'
+        if was['peak_kib'] > 0:
+            memory = '%.2fx' % (result['peak_kib'] / was['peak_kib'])
+        print('%-50s %9.2fx %10s' % (result['name'], result['ops_per_sec'] / was['ops_per_sec'],
+                                     memory), file=out)
+
+
+def main(argv=None):
+    """ Run the benchmarks from the command line. """
+    parser = argparse.ArgumentParser(description='Benchmark MovieLib and the ADT classes.')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='compare with the results in this file')
+    parser.add_argument('--quick', action='store_true', help='skip movies.txt; one repeat')
+    parser.add_argument('--repeat', type=int, default=3, help='timings to take the best of')
+    parser.add_argument('--seed', type=int, default=0, help='seed for shuffles and workloads')
+    parser.add_argument('--only', help='run only benchmarks whose names start with this')
+    args = parser.parse_args(argv)
+    repeat = args.repeat
+    if args.quick:
+        repeat = 1
+
+    old = None
+    if args.compare:
+        file = open(args.compare, 'r', encoding='utf8')
+        old = json.load(file)
+        file.close()
+    results = run_benchmarks(args.quick, repeat, args.seed, args.only)
+    if args.json:
+        file = open(args.json, 'w', encoding='utf8')
+        json.dump(results, file, indent=2)
+        file.close()
+    if old is not None:
+        compare(old, results)
+
+
+if __name__ == '__main__':
+    main()